@@ -0,0 +1,246 @@
+"""Parallel, cached shader compilation with bgfx's shaderc.
+
+Shipped in the bgfx package as res/bgfx_shaders.py. Each shader is compiled for every requested profile concurrently, and
+outputs are kept in a content addressed cache, keyed by the shader source, the include files, the flags and the shaderc
+binary, so shaders that didn't change are copied from the cache instead of being compiled again.
+
+From a recipe consuming bgfx (with tools including shaderc):
+
+    sys.path.insert(0, os.path.join(self.dependencies["bgfx"].package_folder, "res"))
+    import bgfx_shaders
+    bgfx_shaders.compile_shaders(glob.glob("shaders/*.sc"), ["glsl", "spirv"], "build/shaders",
+                                 shaderc=os.path.join(self.dependencies["bgfx"].package_folder, "bin", "shaderc"),
+                                 include_dirs=[os.path.join(self.dependencies["bgfx"].package_folder, "res", "shaders")])
+
+or from the command line, python bgfx_shaders.py --help.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# bgfx's shader folder names (as used by the examples) and the shaderc --platform and --profile they compile with
+PROFILES = {"glsl": ("linux", "120"),
+            "essl": ("android", "100_es"),
+            "spirv": ("linux", "spirv"),
+            "dx11": ("windows", "s_5_0"),
+            "metal": ("osx", "metal")}
+
+SHADER_TYPES = {"vs": "vertex", "fs": "fragment", "cs": "compute"}
+
+# Bump when the cache key layout changes
+CACHE_KEY_VERSION = "1"
+
+
+def default_cache_folder():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.environ.get("BGFX_SHADER_CACHE", os.path.join(base, "bgfx_shaders"))
+
+
+def shader_type(path):
+    # bgfx names shaders vs_*.sc, fs_*.sc and cs_*.sc
+    prefix = os.path.basename(path).split("_", 1)[0]
+    if prefix not in SHADER_TYPES:
+        raise ValueError(f"Can't tell the type of {path}; name it vs_*, fs_* or cs_*, or pass (path, type)")
+    return SHADER_TYPES[prefix]
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _include_digest(folders, varying_def):
+    # Shaders #include any .sh (bgfx_shader.sh, bgfx_compute.sh, the project's common.sh...) from these folders
+    digest = hashlib.sha256()
+    for folder in folders:
+        for root, dirs, files in os.walk(folder):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(".sh"):
+                    path = os.path.join(root, name)
+                    digest.update(f"{os.path.relpath(path, folder)}\0{_file_digest(path)}\0".encode())
+    if varying_def:
+        digest.update(f"varying\0{_file_digest(varying_def)}\0".encode())
+    return digest.hexdigest()
+
+
+class ShaderCache:
+    """Compiled shaders by key, least recently used first out when the cache grows beyond max_size_mb."""
+
+    def __init__(self, folder, max_size_mb=512):
+        self.folder = folder
+        self.max_size = max_size_mb * 1024 * 1024
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], f"{key}.bin")
+
+    def get(self, key, output):
+        path = self._path(key)
+        try:
+            shutil.copyfile(path, output)
+        except FileNotFoundError:
+            return False
+        # The mtime is the last use, which eviction goes by
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True
+
+    def put(self, key, output):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write aside and rename, so concurrent builds never see half an entry
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(output, tmp)
+        os.replace(tmp, path)
+
+    def evict(self):
+        entries = []
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        size = sum(entry[1] for entry in entries)
+        evicted = 0
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            evicted += 1
+        return evicted
+
+
+def _compile_one(shaderc, source, kind, profile_name, output, include_dirs, varying_def, defines, extra_args, key, cache):
+    if cache is not None and cache.get(key, output):
+        return True
+    platform, profile = PROFILES[profile_name]
+    cmd = [shaderc, "-f", source, "-o", output, "--type", kind, "--platform", platform, "-p", profile]
+    for folder in include_dirs:
+        cmd.extend(["-i", folder])
+    if varying_def:
+        cmd.extend(["--varyingdef", varying_def])
+    if defines:
+        cmd.extend(["--define", ";".join(defines)])
+    cmd.extend(extra_args)
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0 or not os.path.exists(output):
+        raise RuntimeError(f"shaderc failed on {source} ({profile_name}):\n{result.stdout}{result.stderr}")
+    if cache is not None:
+        cache.put(key, output)
+    return False
+
+
+def compile_shaders(shaders, profiles, output_folder, shaderc="shaderc", include_dirs=(), varying_def=None, defines=(),
+                    extra_args=(), jobs=None, cache_folder=None, cache_max_size_mb=512, use_cache=True):
+    """Compiles every shader for every profile into output_folder/<profile>/<shader>.bin.
+
+    shaders are paths, or (path, type) pairs for shaders not named vs_*, fs_* or cs_*. profiles are keys of PROFILES.
+    varying_def defaults to the varying.def.sc next to each shader, when there is one. Returns a dict with the output
+    paths and how many were compiled and taken from the cache; raises RuntimeError listing every shader that failed, and
+    ValueError for shaders whose outputs would collide (same name in different folders).
+    """
+    shaderc_path = shutil.which(shaderc) or shaderc
+    unknown = [profile for profile in profiles if profile not in PROFILES]
+    if unknown:
+        raise ValueError(f"Unknown profiles {', '.join(unknown)}; choose from {', '.join(PROFILES)}")
+    cache = ShaderCache(cache_folder or default_cache_folder(), cache_max_size_mb) if use_cache else None
+    shaderc_digest = _file_digest(shaderc_path)
+    flags = f"{sorted(defines)}\0{list(extra_args)}"
+    include_digests = {}
+
+    jobs_args = []
+    sources_of = {}
+    for shader in shaders:
+        source, kind = shader if isinstance(shader, (tuple, list)) else (shader, shader_type(shader))
+        source = os.path.abspath(source)
+        varying = varying_def or os.path.join(os.path.dirname(source), "varying.def.sc")
+        varying = varying if os.path.exists(varying) else None
+        folders = [os.path.dirname(source)] + [os.path.abspath(folder) for folder in include_dirs]
+        include_key = (tuple(folders), varying)
+        if include_key not in include_digests:
+            include_digests[include_key] = _include_digest(folders, varying)
+        source_digest = _file_digest(source)
+        for profile in profiles:
+            key = hashlib.sha256("\0".join([CACHE_KEY_VERSION, shaderc_digest, source_digest, include_digests[include_key],
+                                            kind, *PROFILES[profile], flags]).encode()).hexdigest()
+            output = os.path.join(output_folder, profile, f"{os.path.splitext(os.path.basename(source))[0]}.bin")
+            if output in sources_of:
+                # Listed twice, or another shader of the same name; the latter is reported below
+                sources_of[output].add(source)
+                continue
+            sources_of[output] = {source}
+            jobs_args.append((shaderc_path, source, kind, profile, output, list(include_dirs), varying, list(defines),
+                              list(extra_args), key, cache))
+
+    # Outputs are named after the shader alone, so shaders with the same name in different folders would overwrite each other
+    clashes = sorted({tuple(sorted(sources)) for sources in sources_of.values() if len(sources) > 1})
+    if clashes:
+        raise ValueError("Shaders with the same name would compile to the same output: "
+                         + "; ".join(", ".join(sources) for sources in clashes))
+    for args in jobs_args:
+        os.makedirs(os.path.dirname(args[4]), exist_ok=True)
+
+    # Each job mostly waits on its shaderc process, so threads are enough to keep every core busy
+    outputs, errors, cached = [], [], 0
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        futures = [(args[4], pool.submit(_compile_one, *args)) for args in jobs_args]
+        for output, future in futures:
+            try:
+                cached += future.result()
+                outputs.append(output)
+            except RuntimeError as e:
+                errors.append(str(e))
+    if cache is not None:
+        cache.evict()
+    if errors:
+        raise RuntimeError("\n".join(errors))
+    return {"outputs": outputs, "compiled": len(outputs) - cached, "cached": cached}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile bgfx shaders in parallel, with a cache.")
+    parser.add_argument("shaders", nargs="+", help="vs_*.sc, fs_*.sc and cs_*.sc files")
+    parser.add_argument("-o", "--output", required=True, help="output folder, one subfolder per profile")
+    parser.add_argument("-p", "--profile", action="append", required=True, choices=sorted(PROFILES))
+    parser.add_argument("-i", "--include", action="append", default=[], help="include folder (e.g. the one with bgfx_shader.sh)")
+    parser.add_argument("--varyingdef", help="varying.def.sc to use instead of the one next to each shader")
+    parser.add_argument("--define", action="append", default=[])
+    parser.add_argument("--shaderc", default="shaderc")
+    parser.add_argument("-j", "--jobs", type=int)
+    parser.add_argument("--cache", help=f"cache folder (default {default_cache_folder()})")
+    parser.add_argument("--cache-max-size-mb", type=int, default=512)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args(argv)
+    try:
+        result = compile_shaders(args.shaders, args.profile, args.output, shaderc=args.shaderc, include_dirs=args.include,
+                                 varying_def=args.varyingdef, defines=args.define, jobs=args.jobs, cache_folder=args.cache,
+                                 cache_max_size_mb=args.cache_max_size_mb, use_cache=not args.no_cache)
+    except (RuntimeError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{result['compiled']} compiled, {result['cached']} from the cache")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+/*
+ * Header-only recorder for bgfx's profiler callbacks, packaged with profiler=trace (which builds bgfx with
+ * BGFX_CONFIG_PROFILER and defines BGFX_CONAN_TRACE for consumers).
+ *
+ *   bgfx_trace::Recorder recorder;        // keeps the last 64k scopes by default
+ *   bgfx::Init init;
+ *   init.callback = &recorder;
+ *   bgfx::init(init);
+ *   ...
+ *   bgfx::shutdown();
+ *   recorder.writeChromeTrace("trace.json"); // chrome://tracing, Perfetto
+ *
+ * Every profiler scope bgfx closes (API thread frame, render thread submit, encoders...) becomes one event in a
+ * fixed size ring buffer, so memory stays bounded however long the run; the oldest events are overwritten and
+ * counted as dropped. writeBinary() dumps the ring as is, for when JSON is too big. Calls that aren't profiler calls
+ * are forwarded to the callback passed to the constructor, if any. Only one Recorder should be active at a time,
+ * since the open scopes are tracked per thread.
+ */
+#ifndef BGFX_TRACE_H_HEADER_GUARD
+#define BGFX_TRACE_H_HEADER_GUARD
+
+#include <bgfx/bgfx.h>
+
+#include <atomic>
+#include <chrono>
+#include <cstdarg>
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <mutex>
+#include <vector>
+
+namespace bgfx_trace {
+
+struct Event {
+	uint64_t startNs;
+	uint64_t durationNs;
+	uint32_t threadId;
+	uint32_t abgr;
+	char name[48];
+};
+
+class Recorder : public bgfx::CallbackI {
+public:
+	explicit Recorder(uint32_t capacity = 65536, bgfx::CallbackI* next = nullptr)
+		: m_events(capacity > 0 ? capacity : 1)
+		, m_next(next)
+		, m_origin(std::chrono::steady_clock::now()) {
+	}
+
+	~Recorder() override {
+	}
+
+	// Events in the order they ended, oldest first
+	std::vector<Event> events() const {
+		std::lock_guard<std::mutex> lock(m_mutex);
+		std::vector<Event> result;
+		const uint64_t count = m_written < m_events.size() ? m_written : m_events.size();
+		result.reserve(size_t(count));
+		for (uint64_t i = m_written - count; i < m_written; ++i) {
+			result.push_back(m_events[size_t(i % m_events.size())]);
+		}
+		return result;
+	}
+
+	uint64_t dropped() const {
+		std::lock_guard<std::mutex> lock(m_mutex);
+		return m_written > m_events.size() ? m_written - m_events.size() : 0;
+	}
+
+	void clear() {
+		std::lock_guard<std::mutex> lock(m_mutex);
+		m_written = 0;
+	}
+
+	// Chrome trace-event format: one complete ("X") event per scope, timestamps in microseconds
+	bool writeChromeTrace(const char* path) const {
+		FILE* file = std::fopen(path, "w");
+		if (file == nullptr) {
+			return false;
+		}
+		const std::vector<Event> recorded = events();
+		std::fprintf(file, "{\"traceEvents\":[");
+		for (size_t i = 0; i < recorded.size(); ++i) {
+			const Event& event = recorded[i];
+			std::fprintf(file, "%s\n{\"name\":\"", i == 0 ? "" : ",");
+			for (const char* c = event.name; *c != '\0'; ++c) {
+				if (*c == '"' || *c == '\\') {
+					std::fputc('\\', file);
+				}
+				std::fputc(uint8_t(*c) < 0x20 ? ' ' : *c, file);
+			}
+			std::fprintf(file, "\",\"ph\":\"X\",\"pid\":1,\"tid\":%u,\"ts\":%.3f,\"dur\":%.3f}",
+				event.threadId, event.startNs / 1000.0, event.durationNs / 1000.0);
+		}
+		std::fprintf(file, "\n],\"displayTimeUnit\":\"ms\",\"otherData\":{\"dropped\":%llu}}\n", (unsigned long long)dropped());
+		return std::fclose(file) == 0;
+	}
+
+	// "BGFXTRC1", uint32 event count, uint32 reserved, uint64 dropped, then the Event structs oldest first
+	bool writeBinary(const char* path) const {
+		FILE* file = std::fopen(path, "wb");
+		if (file == nullptr) {
+			return false;
+		}
+		const std::vector<Event> recorded = events();
+		const uint32_t header[2] = {uint32_t(recorded.size()), 0};
+		const uint64_t droppedEvents = dropped();
+		bool ok = std::fwrite("BGFXTRC1", 1, 8, file) == 8
+			&& std::fwrite(header, sizeof(header), 1, file) == 1
+			&& std::fwrite(&droppedEvents, sizeof(droppedEvents), 1, file) == 1
+			&& (recorded.empty() || std::fwrite(recorded.data(), sizeof(Event), recorded.size(), file) == recorded.size());
+		return std::fclose(file) == 0 && ok;
+	}
+
+	void profilerBegin(const char* _name, uint32_t _abgr, const char* /*_filePath*/, uint16_t /*_line*/) override {
+		std::vector<OpenScope>& scopes = openScopes();
+		scopes.push_back(OpenScope{});
+		OpenScope& scope = scopes.back();
+		// Not necessarily a literal, so keep a copy
+		std::strncpy(scope.name, _name != nullptr ? _name : "", sizeof(scope.name) - 1);
+		scope.name[sizeof(scope.name) - 1] = '\0';
+		scope.abgr = _abgr;
+		scope.startNs = now();
+	}
+
+	void profilerBeginLiteral(const char* _name, uint32_t _abgr, const char* _filePath, uint16_t _line) override {
+		profilerBegin(_name, _abgr, _filePath, _line);
+	}
+
+	void profilerEnd() override {
+		const uint64_t end = now();
+		std::vector<OpenScope>& scopes = openScopes();
+		if (scopes.empty()) {
+			return;
+		}
+		const OpenScope& scope = scopes.back();
+		Event event;
+		event.startNs = scope.startNs;
+		event.durationNs = end - scope.startNs;
+		event.threadId = threadId();
+		event.abgr = scope.abgr;
+		std::memcpy(event.name, scope.name, sizeof(event.name));
+		scopes.pop_back();
+
+		std::lock_guard<std::mutex> lock(m_mutex);
+		m_events[size_t(m_written % m_events.size())] = event;
+		++m_written;
+	}
+
+	void fatal(const char* _filePath, uint16_t _line, bgfx::Fatal::Enum _code, const char* _str) override {
+		if (m_next != nullptr) {
+			m_next->fatal(_filePath, _line, _code, _str);
+			return;
+		}
+		std::fprintf(stderr, "%s(%u): bgfx fatal 0x%08x: %s\n", _filePath, _line, unsigned(_code), _str);
+		if (_code != bgfx::Fatal::DebugCheck) {
+			std::abort();
+		}
+	}
+
+	void traceVargs(const char* _filePath, uint16_t _line, const char* _format, va_list _argList) override {
+		if (m_next != nullptr) {
+			m_next->traceVargs(_filePath, _line, _format, _argList);
+		}
+	}
+
+	uint32_t cacheReadSize(uint64_t _id) override {
+		return m_next != nullptr ? m_next->cacheReadSize(_id) : 0;
+	}
+
+	bool cacheRead(uint64_t _id, void* _data, uint32_t _size) override {
+		return m_next != nullptr && m_next->cacheRead(_id, _data, _size);
+	}
+
+	void cacheWrite(uint64_t _id, const void* _data, uint32_t _size) override {
+		if (m_next != nullptr) {
+			m_next->cacheWrite(_id, _data, _size);
+		}
+	}
+
+	void screenShot(const char* _filePath, uint32_t _width, uint32_t _height, uint32_t _pitch, const void* _data, uint32_t _size, bool _yflip) override {
+		if (m_next != nullptr) {
+			m_next->screenShot(_filePath, _width, _height, _pitch, _data, _size, _yflip);
+		}
+	}
+
+	void captureBegin(uint32_t _width, uint32_t _height, uint32_t _pitch, bgfx::TextureFormat::Enum _format, bool _yflip) override {
+		if (m_next != nullptr) {
+			m_next->captureBegin(_width, _height, _pitch, _format, _yflip);
+		}
+	}
+
+	void captureEnd() override {
+		if (m_next != nullptr) {
+			m_next->captureEnd();
+		}
+	}
+
+	void captureFrame(const void* _data, uint32_t _size) override {
+		if (m_next != nullptr) {
+			m_next->captureFrame(_data, _size);
+		}
+	}
+
+private:
+	struct OpenScope {
+		uint64_t startNs;
+		uint32_t abgr;
+		char name[48];
+	};
+
+	static std::vector<OpenScope>& openScopes() {
+		static thread_local std::vector<OpenScope> scopes;
+		return scopes;
+	}
+
+	static uint32_t threadId() {
+		static std::atomic<uint32_t> nextId{1};
+		static thread_local uint32_t id = nextId++;
+		return id;
+	}
+
+	uint64_t now() const {
+		return uint64_t(std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::steady_clock::now() - m_origin).count());
+	}
+
+	mutable std::mutex m_mutex;
+	std::vector<Event> m_events;
+	uint64_t m_written = 0;
+	bgfx::CallbackI* m_next;
+	std::chrono::steady_clock::time_point m_origin;
+};
+
+} // namespace bgfx_trace
+
+#endif // BGFX_TRACE_H_HEADER_GUARD
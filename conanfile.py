@@ -1,20 +1,52 @@
 from conan import ConanFile
-from conan.tools.files import rmdir, rm, copy, rename, replace_in_file
-from conan.tools.build import check_min_cppstd
+from conan.tools.files import rmdir, copy, replace_in_file, mkdir, load, save, update_conandata
+from conan.tools.build import check_min_cppstd, build_jobs
 from conan.tools.scm import Git
 from conan.tools.layout import basic_layout
 from conan.tools.microsoft import is_msvc, check_min_vs, is_msvc_static_runtime
 from conan.tools.apple import fix_apple_shared_install_name, is_apple_os
 from conan.tools.scm import Version
-from conan.errors import ConanInvalidConfiguration
+from conan.errors import ConanInvalidConfiguration, ConanException
 from conan.tools.microsoft import MSBuild, VCVars
 from conan.tools.gnu import Autotools, AutotoolsToolchain
-from conan.tools.env import VirtualBuildEnv
+from conan.tools.env import VirtualBuildEnv, Environment
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
+import fasteners
+import hashlib
+import json
 import os
+import re
+import shlex
+import shutil
+import struct
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError: # Windows has no getrusage; phases then only record wall and own CPU time
+    resource = None
+try:
+    import fcntl
+except ImportError: # Windows; package() then hardlinks or copies
+    fcntl = None
 
 required_conan_version = ">=1.50.0"
 
+# Output buffer of the current source() fetch thread
+_fetch_local = threading.local()
+# fasteners' file locks don't exclude threads of the same process, so every cache lock is paired with one of these
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+# Guards the phase records, which the source() fetch threads append to concurrently
+_phases_lock = threading.Lock()
+
 class bgfxConan(ConanFile):
     name = "bgfx"
     license = "BSD-2-Clause"
@@ -23,11 +55,18 @@ class bgfxConan(ConanFile):
     description = "Cross-platform, graphics API agnostic, \"Bring Your Own Engine/Framework\" style rendering library."
     topics = ("lib-static", "C++", "C++17", "rendering", "gamedev")
     settings = "os", "compiler", "arch", "build_type"
-    options = {"fPIC": [True, False], "shared": [True, False], "tools": [True, False], "rtti": [True, False], "profiler": [True, False], "bx_version": [None, "ANY"], "bimg_version": [None, "ANY"]}
-    default_options = {"fPIC": True, "shared": False, "rtti": True, "tools": False, "profiler": False}
-
-    invalidPackageExceptionText = "Less lib files found for copy than expected. Aborting."
-    expectedNumLibs = 1
+    exports_sources = "bgfx_shaders.py", "bgfx_trace.h"
+    options = {"fPIC": [True, False], "shared": [True, False], "tools": [True, False, "ANY"], "rtti": [True, False], "profiler": [True, False, "trace"], "bx_version": [None, "ANY"], "bimg_version": [None, "ANY"], "prebuilt_deps": [True, False],
+               "compiler_cache": [None, "ccache", "sccache"],
+               "max_draw_calls": [None, "ANY"], "max_views": [None, "ANY"], "max_encoders": [None, "ANY"],
+               "transient_vb_size": [None, "ANY"], "transient_ib_size": [None, "ANY"], "multithreaded": [None, True, False],
+               "lto": [True, False], "cpu_target": ["baseline", "x86-64-v2", "x86-64-v3", "native"],
+               "split_debug": [True, False, "compressed"]}
+    default_options = {"fPIC": True, "shared": False, "rtti": True, "tools": False, "profiler": False, "prebuilt_deps": True,
+                       "compiler_cache": None,
+                       "max_draw_calls": None, "max_views": None, "max_encoders": None,
+                       "transient_vb_size": None, "transient_ib_size": None, "multithreaded": None,
+                       "lto": False, "cpu_target": "baseline", "split_debug": False}
 
     @property
     def _bx_url(self):
@@ -41,6 +80,16 @@ class bgfxConan(ConanFile):
     def _bgfx_url(self):
         return "https://github.com/bkaradzic/bgfx.git"
 
+    @property
+    def _cache_folder(self):
+        folder = self._user_conf("cache_folder")
+        return os.path.abspath(os.path.expanduser(str(folder))) if folder else None
+
+    @property
+    def _source_store(self):
+        folder = self._user_conf("source_store")
+        return os.path.abspath(os.path.expanduser(str(folder))) if folder else None
+
     @property
     def _bx_folder(self):
         return "bx"
@@ -66,7 +115,7 @@ class bgfxConan(ConanFile):
             genie_extra += " --with-shared-lib"
         if self.options.profiler:
             genie_extra += " --with-profiler"
-        if self.options.tools:
+        if self._tools:
             genie_extra += " --with-tools"
         return genie_extra
 
@@ -97,13 +146,85 @@ class bgfxConan(ConanFile):
             projs = [f"{self._lib_target_prefix}bgfx-shared-lib"]
         else:
             projs = [f"{self._lib_target_prefix}bgfx"]
-        if self.options.tools:
-            projs.extend([f"{self._tool_target_prefix}{self._shaderc_target_prefix}shaderc",
-                          f"{self._tool_target_prefix}texturev",
-                          f"{self._tool_target_prefix}geometryc",
-                          f"{self._tool_target_prefix}geometryv"])
+        # genie generates every tool project, but make/MSBuild only build (the dependencies of) the selected ones
+        projs.extend(self._tool_projects[tool] for tool in self._tools)
         return projs
 
+    @property
+    def _tool_projects(self):
+        return {"shaderc": f"{self._tool_target_prefix}{self._shaderc_target_prefix}shaderc",
+                "texturev": f"{self._tool_target_prefix}texturev",
+                "geometryc": f"{self._tool_target_prefix}geometryc",
+                "geometryv": f"{self._tool_target_prefix}geometryv"}
+
+    @property
+    def _tools(self):
+        return self._parse_tools(self.options.tools)
+
+    @staticmethod
+    def _parse_tools(value):
+        # tools is True for all of them, False for none, or a comma separated selection like shaderc,geometryc
+        value = str(value)
+        if value == "True":
+            return ["geometryc", "geometryv", "shaderc", "texturev"]
+        if value in ["False", "None"]:
+            return []
+        return sorted({tool.strip(" '\"") for tool in value.strip("[]").split(",") if tool.strip(" '\"")})
+
+    @property
+    def _prebuilt_projects(self):
+        # bx and bimg genie projects bgfx's build would otherwise compile itself, and the dependency providing each
+        return {"bx": "bx", "bimg": "bimg", "bimg_decode": "bimg", "bimg_encode": "bimg"}
+
+    @property
+    def _bgfx_config_limits(self):
+        # Options overriding bgfx's compile-time BGFX_CONFIG_* limits, with the macro and the accepted range of each
+        return {"max_draw_calls": ("BGFX_CONFIG_MAX_DRAW_CALLS", 1, 1 << 24),
+                "max_views": ("BGFX_CONFIG_MAX_VIEWS", 1, 1024),
+                "max_encoders": ("BGFX_CONFIG_DEFAULT_MAX_ENCODERS", 1, 256),
+                "transient_vb_size": ("BGFX_CONFIG_TRANSIENT_VERTEX_BUFFER_SIZE", 1 << 10, 1 << 30),
+                "transient_ib_size": ("BGFX_CONFIG_TRANSIENT_INDEX_BUFFER_SIZE", 1 << 10, 1 << 30)}
+
+    @property
+    def _bgfx_config_values(self):
+        # Only the options that were set, unset ones keep bgfx's own defaults
+        values = {option: str(self.options.get_safe(option)) for option in self._bgfx_config_limits}
+        return {option: value for option, value in values.items() if value != "None"}
+
+    @property
+    def _bgfx_config_defines(self):
+        defines = [f"{self._bgfx_config_limits[option][0]}={value}" for option, value in self._bgfx_config_values.items()]
+        if str(self.options.multithreaded) != "None":
+            defines.append(f"BGFX_CONFIG_MULTITHREADED={1 if self.options.multithreaded else 0}")
+        return defines
+
+    @property
+    def _codegen_flags(self):
+        # gcc/clang flags for lto and cpu_target; MSVC gets the equivalents through MSBuild and _CL_
+        flags = []
+        if self.options.cpu_target != "baseline":
+            flags.append(f"-march={self.options.cpu_target}")
+        if self.options.lto:
+            # Fat objects keep the static libs usable by consumers that don't link with -flto
+            flags.extend(["-flto=auto", "-ffat-lto-objects"] if self.settings.compiler == "gcc" else ["-flto=thin"])
+        if flags and not is_apple_os(self):
+            # Record the command line in the binaries, so the flags can be checked on the package
+            flags.append("-frecord-gcc-switches" if self.settings.compiler == "gcc" else "-frecord-command-line")
+        return flags
+
+    @property
+    def _compiler_cache_folder(self):
+        return os.path.join(self.generators_folder, "compiler_cache")
+
+    @property
+    def _compiler_cache_wrapped(self):
+        # Compiler names genie's gmake toolchains invoke, which get launcher wrappers of the same name
+        compilers = {"gcc": ["gcc", "g++", "cc", "c++"], "clang": ["clang", "clang++"], "apple-clang": ["clang", "clang++"]}
+        wrapped = compilers.get(str(self.settings.compiler), [])
+        executables = self.conf.get("tools.build:compiler_executables", default={}, check_type=dict)
+        wrapped.extend(os.path.basename(executables[lang]) for lang in ["c", "cpp"] if lang in executables)
+        return wrapped
+
     @property
     def _compiler_required(self):
         return {
@@ -118,6 +239,83 @@ class bgfxConan(ConanFile):
     def _settings_build(self):
         return getattr(self, "settings_build", self.settings)
 
+    @property
+    def _phase_records(self):
+        if not hasattr(self, "_phases"):
+            self._phases = []
+        return self._phases
+
+    @staticmethod
+    def _folder_size(folders):
+        # Other jobs may be fetching into or evicting these folders meanwhile; whatever vanishes mid-walk just isn't
+        # counted, since a measurement must never fail the build (os.walk already skips folders it can't list)
+        size = 0
+        for folder in folders:
+            for root, _, files in os.walk(folder):
+                for name in files:
+                    try:
+                        size += os.lstat(os.path.join(root, name)).st_size
+                    except OSError:
+                        pass
+        return size
+
+    @contextmanager
+    def _phase(self, name, folders=()):
+        # Records wall time, CPU time of this process and its children, child peak RSS and how much the given folders grew.
+        # CPU and RSS are process wide, so phases running concurrently (the source() fetches) share them.
+        children = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+        cpu = time.process_time()
+        size = self._folder_size(folders)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phase = {"name": name, "wall_s": time.perf_counter() - start, "cpu_s": time.process_time() - cpu}
+            if resource:
+                after = resource.getrusage(resource.RUSAGE_CHILDREN)
+                phase["cpu_s"] += after.ru_utime - children.ru_utime + after.ru_stime - children.ru_stime
+                # ru_maxrss is the largest child so far (KiB, bytes on macOS), so it only tells about this phase if it grew
+                if after.ru_maxrss > children.ru_maxrss:
+                    phase["peak_child_rss_mb"] = after.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+            if folders:
+                phase["bytes"] = self._folder_size(folders) - size
+            with _phases_lock:
+                self._phase_records.append(phase)
+
+    def _print_phases(self, phases):
+        self.output.info(f"{'phase':<48} {'wall s':>8} {'cpu s':>8} {'rss MB':>8} {'disk MB':>8}")
+        for phase in phases:
+            rss = f"{phase['peak_child_rss_mb']:.0f}" if "peak_child_rss_mb" in phase else "-"
+            size = f"{phase['bytes'] / (1024 * 1024):.1f}" if "bytes" in phase else "-"
+            self.output.info(f"{phase['name'][:48]:<48} {phase['wall_s']:>8.2f} {phase['cpu_s']:>8.2f} {rss:>8} {size:>8}")
+
+    def _report_phases(self, previous):
+        # Adds this method's phases to those recorded by the previous one and writes them as the build folder's report
+        phases = json.loads(load(self, previous)) if os.path.exists(previous) else []
+        if isinstance(phases, dict):
+            phases = phases["phases"]
+        phases += self._phase_records
+        report = os.path.join(self.build_folder, "bgfx_phases.json")
+        save(self, report, json.dumps({"reference": str(self.ref),
+                                       "settings": {k: str(v) for k, v in self.settings.items()},
+                                       "options": {k: str(v) for k, v in self.options.items()},
+                                       "phases": phases}, indent=1))
+        self._print_phases(phases)
+        self.output.info(f"Phase report written to {report}")
+        self._phase_records.clear()
+
+    def _user_conf(self, name, default=None, check_type=None):
+        # set_version() runs before any profile is applied, so every user.bgfx:* conf can also be given through
+        # the environment as BGFX_CONAN_<NAME> (e.g. user.bgfx:cache_folder -> BGFX_CONAN_CACHE_FOLDER)
+        value = self.conf.get(f"user.bgfx:{name}") if self.conf is not None else None
+        if value is None:
+            value = os.environ.get(f"BGFX_CONAN_{name.upper()}")
+        if value is not None and check_type is bool and isinstance(value, str):
+            value = value.lower() in ["1", "true", "yes", "on"]
+        elif value is not None and check_type is not None:
+            value = check_type(value)
+        return default if value is None else value
+
     def config_options(self):
         if self.settings.os == "Windows":
             del self.options.fPIC
@@ -142,6 +340,34 @@ class bgfxConan(ConanFile):
     def package_id(self):
         if self.info.settings.compiler == "msvc":
             del self.info.settings.compiler.cppstd
+        # These only change how the binaries get built, not what ends up in the package
+        del self.info.options.prebuilt_deps
+        del self.info.options.compiler_cache
+        # The same selection of tools gets the same package, however it was spelled
+        tools = self._parse_tools(self.info.options.tools)
+        self.info.options.tools = ",".join(tools) if tools else False
+        # -march=native means something else on every machine. Keying the package by the cpu it stands for here keeps
+        # a binary built on a newer cpu from being reused, through a remote, on one lacking its instructions
+        if self.info.options.cpu_target == "native":
+            self.info.options.cpu_target = f"native-{self._native_march()}"
+
+    def _native_march(self):
+        # The cpu -march=native resolves to on this machine, e.g. cooperlake
+        compiler = str(self.info.settings.compiler)
+        executables = self.conf.get("tools.build:compiler_executables", default={}, check_type=dict)
+        cc = executables.get("c", "gcc" if compiler == "gcc" else "clang")
+        try:
+            if compiler == "gcc":
+                out = subprocess.run([cc, "-march=native", "-Q", "--help=target"], capture_output=True, text=True, check=True).stdout
+                match = re.search(r"^\s*-march=\s+(\S+)\s*$", out, re.M)
+            else:
+                out = subprocess.run([cc, "-march=native", "-###", "-E", "-x", "c", os.devnull], capture_output=True, text=True, check=True).stderr
+                match = re.search(r'"-target-cpu" "([^"]+)"', out)
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise ConanException(f"cpu_target=native, but {cc} can't tell what -march=native stands for: {e}")
+        if not match:
+            raise ConanException(f"cpu_target=native, but {cc} doesn't tell what -march=native stands for.")
+        return match.group(1)
 
     def configure(self):
         self.options["bimg/*"].bx_version = self.options.bx_version
@@ -149,22 +375,57 @@ class bgfxConan(ConanFile):
     def set_version(self):
         if not self.version:
             self.output.info("Setting version from git.")
-            rmdir(self, self._bgfx_folder)
-            git = Git(self, folder=self._bgfx_folder)
-            git.clone(self._bgfx_url, target=".", args=["--filter=tree:0"])
-            # Hackjob semver! Versioning by commit seems rather annoying for users, so let's version by commit count
-            numCommits = int(git.run("rev-list --count master"))
-            verMajor = 1 + (numCommits // 10000)
-            verMinor = (numCommits // 100) % 100
-            verRev = numCommits % 100
-            self.output.highlight(f"Version {verMajor}.{verMinor}.{verRev}")
-            self.version = f"{verMajor}.{verMinor}.{verRev}"
+            # There's no build folder yet to keep a report in, so this phase is only printed
+            with self._phase("set_version", folders=[self._bgfx_folder] + ([self._mirror_path(self._bgfx_url)] if self._cache_folder else [])):
+                if self._source_store:
+                    # Offline, the latest bgfx is the latest one in the store
+                    versions = self._store_manifest().get(self._bgfx_folder)
+                    if not versions:
+                        raise ConanException("The source store has no bgfx versions to pick the latest of.")
+                    self.version = max(versions, key=Version)
+                elif self._cache_folder:
+                    self.version = self._version_from_count(self._latest_commit_count(self._bgfx_url))
+                else:
+                    rmdir(self, self._bgfx_folder)
+                    git = Git(self, folder=self._bgfx_folder)
+                    git.clone(self._bgfx_url, target=".", args=["--filter=tree:0"])
+                    self.version = self._version_from_count(int(git.run("rev-list --count master")))
+            self.output.highlight(f"Version {self.version}")
+            self._print_phases(self._phase_records)
+            self._phase_records.clear()
+
+    def export(self):
+        # Pin the bgfx commit this version stands for, so source() gets exactly that commit even if master moved since
+        if self._source_store:
+            commit = self._store_entry(self._bgfx_folder, self.version).get("commit")
+            if commit:
+                update_conandata(self, {"commits": {"bgfx": commit}})
+        elif self._cache_folder:
+            update_conandata(self, {"commits": {"bgfx": self._commit_for_version(self._bgfx_url, self.version)}})
 
     def validate(self):
         if not self.options.get_safe("fPIC", True):
             raise ConanInvalidConfiguration("This package does not support builds without fPIC.")
         if self.settings.compiler.get_safe("cppstd"):
             check_min_cppstd(self, 17)
+        if self.options.split_debug and self.settings.os not in ["Linux", "FreeBSD", "Android"]:
+            raise ConanInvalidConfiguration("split_debug uses objcopy debuglinks, which only ELF platforms (Linux, FreeBSD, Android) have.")
+        if self.options.split_debug and self.options.lto and self.settings.compiler in ["clang", "apple-clang"]:
+            raise ConanInvalidConfiguration("split_debug can't strip lto=True clang builds, whose ThinLTO objects are bitcode objcopy can't process.")
+        unknown_tools = [tool for tool in self._tools if tool not in self._tool_projects]
+        if unknown_tools:
+            raise ConanInvalidConfiguration(f"Unknown tools {', '.join(unknown_tools)}; tools takes True, False or a comma separated "
+                                            f"selection of {', '.join(self._tool_projects)}.")
+        config = self._bgfx_config_values
+        for option, value in config.items():
+            macro, minimum, maximum = self._bgfx_config_limits[option]
+            if not value.isdigit() or not minimum <= int(value) <= maximum:
+                raise ConanInvalidConfiguration(f"{option} ({macro}) must be a number from {minimum} to {maximum}.")
+        # The view id part of bgfx's sort keys is a mask of BGFX_CONFIG_MAX_VIEWS - 1
+        if "max_views" in config and int(config["max_views"]) & (int(config["max_views"]) - 1):
+            raise ConanInvalidConfiguration("max_views (BGFX_CONFIG_MAX_VIEWS) must be a power of two.")
+        if str(self.options.multithreaded) == "False" and int(config.get("max_encoders", 1)) > 1:
+            raise ConanInvalidConfiguration("max_encoders above 1 requires multithreaded.")
         if Version(self.dependencies["bimg"].ref.version) < "1.3.30" and self.settings.os in ["Linux", "FreeBSD"] and self.settings.arch == "x86_64" and self.settings_build.arch == "x86":
             raise ConanInvalidConfiguration("The depended on version of the bimg cannot be cross-built to Linux x86 due to old astc breaking that.")
         check_min_vs(self, 191)
@@ -178,6 +439,45 @@ class bgfxConan(ConanFile):
             if self.settings.os == "Windows" and self.settings.arch != "x86_64":
                 raise ConanInvalidConfiguration("Building with mingw on Windows requires 64bit Windows and x86_64-w64-mingw32-g++.")
 
+    def validate_build(self):
+        if self.options.compiler_cache == "sccache" and is_msvc(self):
+            raise ConanInvalidConfiguration("sccache can't be injected into the generated MSBuild projects; use compiler_cache=ccache.")
+        if self.options.compiler_cache and self.settings.os == "Windows" and not is_msvc(self):
+            # bx's mingw toolchain calls $(MINGW)/bin/x86_64-w64-mingw32-g++ by absolute path, past any PATH wrapper
+            raise ConanInvalidConfiguration("compiler_cache isn't supported for mingw builds, whose makefiles call the compilers by absolute path.")
+        if self.options.cpu_target in ["x86-64-v2", "x86-64-v3"]:
+            if self.settings.arch != "x86_64":
+                raise ConanInvalidConfiguration(f"cpu_target={self.options.cpu_target} is only available for x86_64.")
+            # The x86-64 microarchitecture levels are known to -march from gcc 11 and clang 12
+            minimum_march_levels = {"gcc": "11", "clang": "12", "apple-clang": "13"}
+            compiler = str(self.settings.compiler)
+            if compiler in minimum_march_levels and Version(self.settings.compiler.version) < minimum_march_levels[compiler]:
+                raise ConanInvalidConfiguration(f"cpu_target={self.options.cpu_target} requires {compiler} {minimum_march_levels[compiler]} or newer.")
+        if is_msvc(self) and self.options.cpu_target in ["x86-64-v2", "native"]:
+            raise ConanInvalidConfiguration(f"MSVC has no /arch matching cpu_target={self.options.cpu_target}; use baseline or x86-64-v3 (/arch:AVX2).")
+        # Linking the packaged bx/bimg into bgfx's tools and shared lib is only sound if they were built the same way
+        # The MSBuild projects always build bx and bimg themselves, so there's nothing to check for MSVC
+        if not self.options.prebuilt_deps or is_msvc(self):
+            return
+        for dep in sorted(set(self._prebuilt_projects.values())):
+            dependency = self.dependencies[dep]
+            mismatches = [f"{setting}={dependency.settings.get_safe(setting)}"
+                          for setting in ["arch", "compiler", "compiler.libcxx", "compiler.runtime", "compiler.runtime_type"]
+                          if str(dependency.settings.get_safe(setting)) != str(self.settings.get_safe(setting))]
+            # bx's debug checks (BX_CONFIG_DEBUG) follow the genie config, which only tells Debug from everything else
+            if (dependency.settings.get_safe("build_type") == "Debug") != (self.settings.build_type == "Debug"):
+                mismatches.append(f"build_type={dependency.settings.get_safe('build_type')}")
+            if dependency.options.get_safe("shared"):
+                mismatches.append("shared=True")
+            if dependency.options.get_safe("rtti") is not None and bool(dependency.options.get_safe("rtti")) != bool(self.options.rtti):
+                mismatches.append(f"rtti={dependency.options.get_safe('rtti')}")
+            # The static bx and bimg end up inside the shared bgfx, so they need position independent code too
+            if self.options.shared and str(dependency.options.get_safe("fPIC")) == "False":
+                mismatches.append("fPIC=False")
+            if mismatches:
+                raise ConanInvalidConfiguration(f"prebuilt_deps links the packaged {dep}, which was built with {', '.join(mismatches)}. "
+                                                f"Build {dep} to match or set {self.name}/*:prebuilt_deps=False.")
+
     def build_requirements(self):
         self.tool_requires("genie/1181")
         if not is_msvc(self) and self._settings_build.os == "Windows":
@@ -190,23 +490,690 @@ class bgfxConan(ConanFile):
         if self.settings.os == "Android" and "ANDROID_NDK_ROOT" not in os.environ:
             self.tool_requires("android-ndk/[>=r26d]")
 
-    def cloneVersion(self, folder, url, version):
-        git = Git(self, folder=folder)
-        git.clone(url, target=".", args=["--filter=tree:0"])
-        self.output.info(f"Getting {folder} version {version}")
-        numCommitsLatest = int(git.run("rev-list --count master"))
+    @contextmanager
+    def _cache_lock(self, path, shared=False, blocking=True):
+        # Mirrors are shared between concurrent conan processes: readers clone from them, writers fetch into or evict them
+        with _thread_locks_guard:
+            thread_lock = _thread_locks.setdefault(path, threading.Lock())
+        if not thread_lock.acquire(blocking=blocking):
+            yield False
+            return
+        try:
+            lock = fasteners.InterProcessReaderWriterLock(f"{path}.lock")
+            acquire, release = (lock.acquire_read_lock, lock.release_read_lock) if shared else (lock.acquire_write_lock, lock.release_write_lock)
+            if not acquire(blocking=blocking):
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                release()
+        finally:
+            thread_lock.release()
+
+    def _fetch_log(self, message):
+        # Concurrent fetches buffer their output per repo so it can be printed in one readable block
+        lines = getattr(_fetch_local, "lines", None)
+        if lines is None:
+            self.output.info(message)
+        else:
+            lines.extend(message.splitlines())
+
+    def _git(self, folder, cmd, hidden_output=None):
+        # Stand-in for Git.run, which chdirs the whole process and so can't be used from source()'s fetch threads
+        self._fetch_log(f"RUN: git {cmd if hidden_output is None else cmd.replace(hidden_output, '<hidden>')}")
+        cancel = getattr(self, "_fetch_cancel", None)
+        if cancel is not None and cancel.is_set():
+            raise ConanException("Cancelled because another fetch failed.")
+        args = f"git {cmd}" if os.name == "nt" else shlex.split(f"git {cmd}")
+        proc = subprocess.Popen(args, cwd=os.path.abspath(folder), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        procs = getattr(self, "_fetch_procs", set())
+        procs.add(proc)
+        try:
+            out, err = proc.communicate()
+        finally:
+            procs.discard(proc)
+        if proc.returncode != 0:
+            error = err.strip() if hidden_output is None else err.strip().replace(hidden_output, "<hidden>")
+            raise ConanException(f"git failed in {folder}: {error}")
+        return out.strip()
+
+    def _mirror_path(self, url):
+        name = url.rstrip("/").split("/")[-1]
+        if not name.endswith(".git"):
+            name += ".git"
+        return os.path.join(self._cache_folder, "mirrors", f"{hashlib.sha1(url.encode()).hexdigest()[:10]}-{name}")
+
+    def _update_mirror(self, url):
+        # Returns an up to date bare mirror of url, or None when no cache folder is configured
+        if not self._cache_folder:
+            return None
+        mirror = self._mirror_path(url)
+        mkdir(self, os.path.dirname(mirror))
+        with self._cache_lock(mirror):
+            if os.path.isdir(mirror):
+                self._fetch_log(f"Updating mirror {mirror}")
+                self._git(mirror, "remote update --prune")
+            else:
+                # Clone next to the final location so an interrupted clone never looks like a valid mirror
+                partial = f"{mirror}.partial"
+                rmdir(self, partial)
+                self._git(os.path.dirname(mirror), f"clone --mirror \"{url}\" \"{os.path.basename(partial)}\"", hidden_output=url)
+                os.replace(partial, mirror)
+            # The stamp's mtime is the last use time the eviction policy goes by
+            Path(f"{mirror}.stamp").touch()
+        self._evict_mirrors(keep=mirror)
+        return mirror
+
+    @contextmanager
+    def _read_mirror(self, url):
+        # An up to date mirror of url, read locked until the block ends so no other job can evict it meanwhile.
+        # Another job may still evict it between the update and the read lock, hence the retries.
+        for _ in range(3):
+            mirror = self._update_mirror(url)
+            with self._cache_lock(mirror, shared=True):
+                if os.path.isdir(mirror):
+                    yield mirror
+                    return
+            self._fetch_log(f"Mirror {mirror} was evicted right after its update; updating it again")
+        raise ConanException(f"The mirror of {url} keeps being evicted by other jobs; raise user.bgfx:cache_max_age_days or user.bgfx:cache_max_size_mb.")
+
+    def _evict_mirrors(self, keep):
+        max_age_days = self._user_conf("cache_max_age_days", default=30, check_type=int)
+        max_size_mb = self._user_conf("cache_max_size_mb", check_type=int)
+        mirrors_folder = os.path.dirname(keep)
+        mirrors = []
+        for entry in os.listdir(mirrors_folder):
+            mirror = os.path.join(mirrors_folder, entry)
+            if entry.endswith(".git") and mirror != keep and os.path.isdir(mirror):
+                stamp = f"{mirror}.stamp"
+                last_used = os.path.getmtime(stamp) if os.path.exists(stamp) else 0
+                mirrors.append((last_used, mirror))
+        total_size = 0
+        sizes = {}
+        if max_size_mb:
+            for folder in [keep] + [mirror for _, mirror in mirrors]:
+                # Other jobs' mirrors are sized without their locks; files they remove meanwhile are just not counted
+                sizes[folder] = self._folder_size([folder])
+                total_size += sizes[folder]
+        # Least recently used first
+        for last_used, mirror in sorted(mirrors):
+            too_old = max_age_days and time.time() - last_used > max_age_days * 86400
+            too_big = max_size_mb and total_size > max_size_mb * 1024 * 1024
+            if not (too_old or too_big):
+                continue
+            with self._cache_lock(mirror, blocking=False) as locked:
+                # Skip mirrors another job is currently using; they get another chance next time
+                if not locked:
+                    continue
+                self._fetch_log(f"Evicting mirror {mirror}")
+                rmdir(self, mirror)
+                if os.path.exists(f"{mirror}.stamp"):
+                    os.remove(f"{mirror}.stamp")
+                total_size -= sizes.get(mirror, 0)
+
+    # Hackjob semver! Versioning by commit seems rather annoying for users, so let's version by commit count
+    @staticmethod
+    def _version_from_count(numCommits):
+        verMajor = 1 + (numCommits // 10000)
+        verMinor = (numCommits // 100) % 100
+        verRev = numCommits % 100
+        return f"{verMajor}.{verMinor}.{verRev}"
+
+    @staticmethod
+    def _count_from_version(version):
         splitVer = str(version).split(".")
-        numCommitsBack = numCommitsLatest - (int(splitVer[2]) + int(splitVer[1]) * 100 + (int(splitVer[0]) - 1) * 10000)
-        if numCommitsBack > 0:
-            git.run(f"checkout HEAD~{numCommitsBack}")
-        self.output.info(git.run("show -s"))
+        return int(splitVer[2]) + int(splitVer[1]) * 100 + (int(splitVer[0]) - 1) * 10000
+
+    @property
+    def _version_index_path(self):
+        return os.path.join(self._cache_folder, "version_index.json")
+
+    # Bump when the way commits are labelled changes, so existing indexes are rebuilt
+    _version_index_format = 2
+
+    def _load_version_index(self):
+        path = self._version_index_path
+        return json.loads(load(self, path)) if os.path.exists(path) else {}
+
+    def _label_commits(self, repo, known=None, knownCount=None):
+        # Versions of the first parent commits of master after known (whose count is knownCount), and master's count.
+        # A commit's version is its own commit count, so the labels never depend on when or where they're computed.
+        git = lambda cmd: self._git(repo, cmd)
+        counts = {known: knownCount} if known else {}
+        versions = {}
+        # Oldest first, so every commit's first parent is counted before it
+        newCommits = git(f"log --first-parent --reverse --format=\"%H %P\" {f'{known}..master' if known else 'master'}")
+        for line in newCommits.splitlines():
+            commit, *parents = line.split()
+            if not parents:
+                counts[commit] = 1
+            else:
+                parent = parents[0]
+                if parent not in counts:
+                    # known reached master through a merge's second parent
+                    counts[parent] = int(git(f"rev-list --count {parent}"))
+                # Only merges bring more than the commit itself on top of the first parent
+                added = 1 if len(parents) == 1 else int(git(f"rev-list --count {parent}..{commit}"))
+                counts[commit] = counts[parent] + added
+            versions[self._version_from_count(counts[commit])] = commit
+        head = git("rev-parse master")
+        return versions, counts[head] if head in counts else int(git("rev-list --count master"))
+
+    def _first_parent_with_count(self, repo, count):
+        # The first parent commit of master whose own commit count is count, or None. Counts only grow along the first
+        # parent chain, so a binary search finds it with a few rev-list --count instead of labelling the whole history.
+        chain = self._git(repo, "rev-list --first-parent master").split()
+        low, high = 0, len(chain) - 1
+        while low <= high:
+            middle = (low + high) // 2
+            middleCount = int(self._git(repo, f"rev-list --count {chain[middle]}"))
+            if middleCount == count:
+                return chain[middle]
+            # Newest first, so the counts decrease along chain
+            if middleCount > count:
+                low = middle + 1
+            else:
+                high = middle - 1
+        return None
+
+    def _update_version_index(self, url, repo):
+        # Maps the version of every first parent commit of url's master to that commit, extending the index with only
+        # the commits added since the last update. repo must hold the full history of master (e.g. a mirror).
+        path = self._version_index_path
+        with self._cache_lock(path):
+            index = self._load_version_index()
+            entry = index.get(url, {})
+            git = lambda cmd: self._git(repo, cmd)
+            head = git("rev-parse master")
+            if entry.get("format") != self._version_index_format:
+                # Older indexes labelled commits by their distance from the head, which merges shift
+                entry = index[url] = {"format": self._version_index_format, "head": None, "versions": {}}
+            if head == entry["head"] and "count" in entry:
+                return entry
+            known = entry["head"] if "count" in entry else None
+            if known and git(f"merge-base master {known}") != known:
+                self._fetch_log(f"WARN: History of {url} was rewritten; rebuilding its version index")
+                known = None
+                entry["versions"] = {}
+            versions, count = self._label_commits(repo, known, entry.get("count"))
+            entry["versions"].update(versions)
+            entry["head"] = head
+            entry["count"] = count
+            # Written aside and renamed, since other jobs read the index without taking its lock
+            fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), prefix="version_index.", suffix=".partial")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(json.dumps(index, indent=1, sort_keys=True))
+                os.replace(partial, path)
+            except BaseException:
+                os.remove(partial)
+                raise
+            return entry
+
+    def _latest_commit_count(self, url):
+        # A cheap ls-remote tells whether the indexed head is still current; only then is the mirror fetched
+        remoteHead = self._git(".", f"ls-remote {url} refs/heads/master", hidden_output=url).split()[0]
+        entry = self._load_version_index().get(url, {})
+        if entry.get("head") != remoteHead or "count" not in entry:
+            with self._read_mirror(url) as mirror:
+                entry = self._update_version_index(url, mirror)
+        return entry["count"]
+
+    def _commit_for_version(self, url, version):
+        commit = self._load_version_index().get(url, {}).get("versions", {}).get(str(version))
+        if commit is None:
+            with self._read_mirror(url) as mirror:
+                commit = self._update_version_index(url, mirror)["versions"].get(str(version))
+        if commit is None:
+            raise ConanException(f"Version {version} of {url} does not exist (yet).")
+        return commit
+
+    def cloneVersion(self, folder, url, version, commit=None):
+        mkdir(self, folder)
+        if self._source_store:
+            self._source_from_store(folder, version)
+            return
+        if commit is None and self._cache_folder:
+            commit = self._commit_for_version(url, version)
+        if commit is not None:
+            self._fetch_log(f"Getting {folder} version {version} from commit {commit}")
+            mirror = self._mirror_path(url) if self._cache_folder else None
+            with self._cache_lock(mirror, shared=True) if mirror else nullcontext(False) as locked:
+                # Only checked under the lock, so the mirror can't be evicted between the check and the fetch
+                from_mirror = locked and os.path.isdir(mirror)
+                origin = Path(mirror).as_uri() if from_mirror else url
+                self._git(folder, "init")
+                self._git(folder, f"remote add origin \"{origin}\"", hidden_output=origin)
+                self._git(folder, f"fetch --depth 1 origin {commit}")
+                self._git(folder, "checkout FETCH_HEAD")
+            if from_mirror:
+                self._git(folder, f"remote set-url origin \"{url}\"", hidden_output=url)
+            self._fetch_log(self._git(folder, "show -s"))
+            return
+        self._git(folder, f"clone \"{url}\" --filter=tree:0 .", hidden_output=url)
+        self._fetch_log(f"Getting {folder} version {version}")
+        # Same labels as the version index, so a version is the same commit with or without a cache folder
+        commit = self._first_parent_with_count(folder, self._count_from_version(version))
+        if commit is None:
+            raise ConanException(f"Version {version} of {url} does not exist (yet).")
+        self._git(folder, f"checkout {commit}")
+        self._fetch_log(self._git(folder, "show -s"))
+
+    def _store_manifest(self):
+        # <store>/manifest.json: {"<repo>": {"<version>": {"file": ..., "sha256": ..., "commit": ...}}}, files relative to the store
+        manifest = os.path.join(self._source_store, "manifest.json")
+        if not os.path.isfile(manifest):
+            raise ConanException(f"user.bgfx:source_store is set, but there's no {manifest}.")
+        return json.loads(load(self, manifest))
+
+    def _store_entry(self, repo, version):
+        entries = self._store_manifest().get(repo, {})
+        if str(version) not in entries:
+            raise ConanException(f"The source store has no {repo} {version}; it has {', '.join(sorted(entries, key=Version)) or 'no versions'}.")
+        entry = entries[str(version)]
+        if "file" not in entry or "sha256" not in entry:
+            raise ConanException(f"The source store entry for {repo} {version} needs both a file and its sha256.")
+        return entry
+
+    @staticmethod
+    def _check_sha256(path, sha256, digest=None):
+        # digest, when given, already went over the whole file
+        if digest is None:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        if digest.hexdigest() != sha256:
+            raise ConanException(f"{path} has sha256 {digest.hexdigest()}, but the store manifest says {sha256}.")
+
+    def _extract_store_file(self, path, sha256, commit, tree):
+        # Nothing is kept unless the hash matches, and nothing is unpacked from a file that could be anything before its
+        # hash is checked, unless tarfile's data filter keeps the archive's members inside tree
+        if path.endswith(".bundle"):
+            self._check_sha256(path, sha256)
+            self._git(os.path.dirname(tree), f"clone --no-checkout \"{path}\" \"{os.path.basename(tree)}\"")
+            self._git(tree, f"checkout {commit or 'HEAD'}")
+            return tree
+
+        if hasattr(tarfile, "data_filter"):
+            digest = hashlib.sha256()
+
+            class HashingReader:
+                def __init__(self, f):
+                    self._f = f
+
+                def read(self, size=-1):
+                    data = self._f.read(size)
+                    digest.update(data)
+                    return data
+
+            # Hashes the file in the same pass as unpacking it; r|* streams through the archive (and its
+            # compression) once, without seeking back
+            with open(path, "rb") as f:
+                reader = HashingReader(f)
+                with tarfile.open(fileobj=reader, mode="r|*") as tar:
+                    tar.extractall(tree, filter="data")
+                # The hash covers the whole file, tar padding included
+                while reader.read(1 << 20):
+                    pass
+            self._check_sha256(path, sha256, digest)
+        else:
+            self._check_sha256(path, sha256)
+            with tarfile.open(path) as tar:
+                tar.extractall(tree)
+        # Archives of a repo usually have everything under one <repo>-<commit> folder
+        entries = os.listdir(tree)
+        if len(entries) == 1 and os.path.isdir(os.path.join(tree, entries[0])):
+            return os.path.join(tree, entries[0])
+        return tree
+
+    def _source_from_store(self, folder, version):
+        entry = self._store_entry(folder, version)
+        path = os.path.join(self._source_store, entry["file"])
+        commit = entry.get("commit")
+        self._fetch_log(f"Getting {folder} version {version} from {entry['file']}")
+        if not self._cache_folder:
+            # The store may well be read-only, so without a cache folder the tree is only extracted for this build
+            staging = tempfile.mkdtemp(prefix=f"bgfx-{folder}.")
+            try:
+                self._copy_tree(self._extract_store_file(path, entry["sha256"], commit, os.path.join(staging, "tree")), folder)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        else:
+            # Extracted trees are kept by content, so later builds of the same version only copy them
+            trees = os.path.join(self._cache_folder, "trees")
+            tree = os.path.join(trees, entry["sha256"] + (f"-{commit}" if commit and path.endswith(".bundle") else ""))
+            if os.path.isdir(tree):
+                self._fetch_log(f"Reusing the extracted {entry['file']}")
+            else:
+                mkdir(self, trees)
+                staging = tempfile.mkdtemp(dir=trees, prefix=f"{os.path.basename(tree)}.")
+                try:
+                    root = self._extract_store_file(path, entry["sha256"], commit, os.path.join(staging, "tree"))
+                    # Renaming into place is atomic, so concurrent builds either see the whole tree or none
+                    try:
+                        os.rename(root, tree)
+                    except OSError:
+                        if not os.path.isdir(tree):
+                            raise
+                finally:
+                    shutil.rmtree(staging, ignore_errors=True)
+            self._copy_tree(tree, folder)
+        if os.path.isdir(os.path.join(folder, ".git")):
+            self._fetch_log(self._git(folder, "show -s"))
+
+    def _copy_tree(self, tree, folder):
+        # Copies, never hardlinks: build() patches files of the source in place
+        shutil.copytree(tree, folder, symlinks=True, dirs_exist_ok=True,
+                        copy_function=lambda src, dst: self._reflink(src, dst) or shutil.copy2(src, dst))
+
+    def _logged_clone_version(self, folder, url, version, commit):
+        _fetch_local.lines = []
+        try:
+            with self._phase(f"source {folder}", folders=[folder] + ([self._mirror_path(url)] if self._cache_folder else [])):
+                self.cloneVersion(folder, url, version, commit)
+            return _fetch_local.lines, None
+        except Exception as e:
+            return _fetch_local.lines, e
+        finally:
+            del _fetch_local.lines
 
     def source(self):
         # bgfx requires bx and bimg source to build
         self.output.info("Getting source")
-        self.cloneVersion(self._bx_folder, self._bx_url, self.dependencies["bx"].ref.version)
-        self.cloneVersion(self._bimg_folder, self._bimg_url, self.dependencies["bimg"].ref.version)
-        self.cloneVersion(self._bgfx_folder, self._bgfx_url, self.version)
+        fetches = [(self._bx_folder, self._bx_url, self.dependencies["bx"].ref.version, None),
+                   (self._bimg_folder, self._bimg_url, self.dependencies["bimg"].ref.version, None),
+                   (self._bgfx_folder, self._bgfx_url, self.version, (self.conan_data or {}).get("commits", {}).get("bgfx"))]
+        # The three repos are independent, so fetch them concurrently; the first failure cancels the others
+        self._fetch_cancel = threading.Event()
+        self._fetch_procs = set()
+        error = None
+        with ThreadPoolExecutor(max_workers=max(1, self._user_conf("fetch_jobs", default=len(fetches), check_type=int))) as pool:
+            futures = {pool.submit(self._logged_clone_version, *fetch): fetch[0] for fetch in fetches}
+            for future in as_completed(futures):
+                lines, fetch_error = future.result()
+                for line in lines:
+                    self.output.info(f"[{futures[future]}] {line}")
+                if fetch_error is not None and error is None:
+                    error = fetch_error
+                    self._fetch_cancel.set()
+                    for proc in list(self._fetch_procs):
+                        proc.terminate()
+        if error is not None:
+            raise error
+        # Picked up by build(), which gets a copy of the source folder
+        save(self, os.path.join(self.source_folder, "bgfx_phases.json"), json.dumps(self._phase_records, indent=1))
+        self._phase_records.clear()
+
+    def _run_genie(self, genie_args, project_file):
+        # Regenerating rewrites every makefile/.sln and so defeats incremental builds; only do it when an input changed
+        inputs = hashlib.sha256(f"{self.dependencies.build['genie'].ref} {genie_args}".encode())
+        for folder in [self._bx_folder, self._bimg_folder, self._bgfx_folder]:
+            for script in sorted(Path(self.source_folder, folder, "scripts").rglob("*.lua")):
+                inputs.update(f"{script.relative_to(self.source_folder).as_posix()}\0".encode())
+                inputs.update(script.read_bytes())
+        # The projects are generated into the source tree that every build folder shares, so the stamp lives with them
+        stamp = os.path.join(os.path.dirname(project_file), "genie.stamp")
+        if os.path.exists(project_file) and os.path.exists(stamp) and load(self, stamp) == inputs.hexdigest():
+            self.output.info("genie inputs unchanged; keeping the generated projects.")
+            return
+        with self._phase("genie"):
+            self.run(f"genie {genie_args}", cwd=self._bgfx_path)
+        save(self, stamp, inputs.hexdigest())
+
+    def _make_target(self, proj_path, proj, config):
+        # Artifact that the genie generated <proj>.make builds for config, or None if there's no such project
+        make_file = os.path.join(proj_path, f"{proj}.make")
+        if not os.path.exists(make_file):
+            return None
+        section = re.search(rf"^ifeq \(\$\(config\),{config}\)$(.*?)^endif$", load(self, make_file), re.M | re.S).group(1)
+        target_dir = re.search(r"^\s*TARGETDIR\s*=\s*(.+?)\s*$", section, re.M).group(1)
+        target = re.search(r"^\s*TARGET\s*=\s*(.+?)\s*$", section, re.M).group(1).replace("$(TARGETDIR)", target_dir)
+        return os.path.normpath(os.path.join(proj_path, target))
+
+    def _msbuild_target(self, projects_path, proj, configuration, platform):
+        # Artifact that the genie generated <proj>.vcxproj builds for configuration|platform, or None if there's no such project
+        vcxproj = next(Path(projects_path).rglob(f"{proj}.vcxproj"), None)
+        if vcxproj is None:
+            return None
+        condition = re.escape(f"'$(Configuration)|$(Platform)'=='{configuration}|{platform}'")
+        sections = "".join(re.findall(rf"<PropertyGroup Condition=\"{condition}\"[^>]*>(.*?)</PropertyGroup>", load(self, str(vcxproj)), re.S))
+        properties = dict(re.findall(r"<(OutDir|TargetName|TargetExt|ConfigurationType)>(.*?)</\1>", sections))
+        target_ext = properties.get("TargetExt") or {"StaticLibrary": ".lib", "DynamicLibrary": ".dll"}.get(properties.get("ConfigurationType"), ".exe")
+        return os.path.normpath(os.path.join(vcxproj.parent, properties["OutDir"], properties.get("TargetName", proj) + target_ext))
+
+    @property
+    def _artifacts_path(self):
+        return os.path.join(self.build_folder, "bgfx_artifacts.json")
+
+    def _save_artifacts(self, target_of):
+        # What each configured project built, by library/tool name, for package() to place
+        artifacts = {"bgfx": target_of("bgfx-shared-lib" if self.options.shared else "bgfx")}
+        artifacts.update({tool: target_of(tool) for tool in self._tools})
+        save(self, self._artifacts_path, json.dumps(artifacts, indent=1))
+
+    def _package_manifest(self):
+        # (built file, destination in the package, required) for every artifact of the configured projects
+        if not os.path.exists(self._artifacts_path):
+            raise ConanException(f"{self._artifacts_path} is missing; package() needs a build() of this recipe first.")
+        artifacts = json.loads(load(self, self._artifacts_path))
+        unknown = [name for name, target in artifacts.items() if target is None]
+        if unknown:
+            raise ConanException(f"genie generated no project for {', '.join(unknown)}, so there's nothing to package for it.")
+        lib = artifacts.pop("bgfx")
+        lib_dir = os.path.dirname(lib)
+        lib_stem, lib_ext = os.path.splitext(os.path.basename(lib))
+        lib_prefix = "" if is_msvc(self) else "lib"
+        manifest = []
+        if not self.options.shared:
+            manifest.append((lib, f"lib/{lib_prefix}bgfx{lib_ext}", True))
+        elif is_apple_os(self):
+            # Apparently apple dylibs break if renamed
+            manifest.append((lib, f"lib/{os.path.basename(lib)}", True))
+        elif self.settings.os == "Windows":
+            manifest.append((lib, f"bin/{os.path.basename(lib)}", True))
+            # The import lib is named after the dll, which it keeps referring to under its own name
+            import_libs = [f"{lib_stem}.lib"] if is_msvc(self) else [f"lib{lib_stem}.dll.a", f"lib{lib_stem}.a", f"{lib_stem}.a"]
+            import_lib = next((name for name in import_libs if os.path.exists(os.path.join(lib_dir, name))), import_libs[0])
+            manifest.append((os.path.join(lib_dir, import_lib), f"lib/{lib_prefix}bgfx{'.lib' if is_msvc(self) else '.a'}", True))
+        else:
+            manifest.append((lib, f"lib/libbgfx{lib_ext}", True))
+        if is_msvc(self):
+            # Debug info files are optional
+            manifest.append((os.path.join(lib_dir, f"{lib_stem}.pdb"), f"lib/{lib_stem}.pdb", False))
+        for tool, target in artifacts.items():
+            tool_stem, tool_ext = os.path.splitext(os.path.basename(target))
+            manifest.append((target, f"bin/{tool}{tool_ext}", True))
+            if is_msvc(self):
+                manifest.append((os.path.join(os.path.dirname(target), f"{tool_stem}.pdb"), f"bin/{tool}.pdb", False))
+        return manifest
+
+    @staticmethod
+    def _reflink(src, dst):
+        # Copy-on-write clone (FICLONE) on filesystems that support it, such as btrfs and XFS
+        if fcntl is None or not sys.platform.startswith("linux"):
+            return False
+        try:
+            with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+                fcntl.ioctl(dst_file.fileno(), 0x40049409, src_file.fileno())
+        except OSError:
+            if os.path.exists(dst):
+                os.remove(dst)
+            return False
+        shutil.copystat(src, dst)
+        return True
+
+    def _place(self, src, dst):
+        # Large artifacts share their data with the build folder rather than being copied: a reflink where the
+        # filesystem allows, a hard link otherwise; anything modifying a packaged file must replace it, not edit it
+        mkdir(self, os.path.dirname(dst))
+        if os.path.lexists(dst):
+            os.remove(dst)
+        if os.path.getsize(src) >= 1 << 20:
+            if self._reflink(src, dst):
+                return "reflink"
+            try:
+                os.link(src, dst)
+                return "hardlink"
+            except OSError:
+                pass
+        shutil.copy2(src, dst)
+        return "copy"
+
+    @property
+    def _objcopy(self):
+        objcopy = self._user_conf("objcopy")
+        if objcopy:
+            return objcopy
+        if self.settings.os == "Android":
+            # The host's binutils rarely know the target's ELF machine; the NDK's llvm-objcopy knows them all
+            ndk = self.conf.get("tools.android:ndk_path") or os.environ.get("ANDROID_NDK_ROOT")
+            found = sorted(Path(ndk).glob("toolchains/llvm/prebuilt/*/bin/llvm-objcopy*")) if ndk else []
+            return f"\"{found[0]}\"" if found else "llvm-objcopy"
+        return "objcopy"
+
+    @staticmethod
+    def _elf_build_id(path):
+        # Hex GNU build id of a linked ELF file, from its SHT_NOTE sections, or None
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != b"\x7fELF":
+            return None
+        is64 = data[4] == 2
+        order = "<" if data[5] == 1 else ">"
+        if is64:
+            shoff, = struct.unpack_from(f"{order}Q", data, 0x28)
+            shentsize, shnum = struct.unpack_from(f"{order}HH", data, 0x3A)
+        else:
+            shoff, = struct.unpack_from(f"{order}I", data, 0x20)
+            shentsize, shnum = struct.unpack_from(f"{order}HH", data, 0x2E)
+        for i in range(shnum):
+            header = shoff + i * shentsize
+            if is64:
+                shtype, = struct.unpack_from(f"{order}I", data, header + 4)
+                offset, size = struct.unpack_from(f"{order}QQ", data, header + 0x18)
+            else:
+                shtype, = struct.unpack_from(f"{order}I", data, header + 4)
+                offset, size = struct.unpack_from(f"{order}II", data, header + 0x10)
+            position = offset
+            while shtype == 7 and position + 12 <= offset + size:
+                namesz, descsz, notetype = struct.unpack_from(f"{order}III", data, position)
+                name_start = position + 12
+                desc_start = name_start + (namesz + 3) // 4 * 4
+                if notetype == 3 and data[name_start:name_start + namesz] == b"GNU\0":
+                    return data[desc_start:desc_start + descsz].hex()
+                position = desc_start + (descsz + 3) // 4 * 4
+        return None
+
+    def _split_debug(self, artifact):
+        # Strips the debug info from a packaged ELF file. The debug info goes to user.bgfx:debug_folder, outside the
+        # package, when it's set: linked files by build id (.build-id/ab/cdef....debug, where gdb and debuginfod look),
+        # static libs (which aren't debugged by themselves) as an unstripped copy under <ref>/<package id>/.
+        # Files are always replaced rather than edited, since they may be hardlinked to the build folder
+        path = os.path.join(self.package_folder, artifact)
+        with open(path, "rb") as f:
+            magic = f.read(8)
+        if not magic.startswith(b"\x7fELF") and magic != b"!<arch>\n":
+            return
+        objcopy = self._objcopy
+        compress = " --compress-debug-sections=zlib" if self.options.split_debug == "compressed" else ""
+        debug_folder = self._user_conf("debug_folder")
+        stripped = f"{path}.stripped"
+        size = os.path.getsize(path)
+        debug_file = None
+        if debug_folder:
+            build_id = self._elf_build_id(path) if magic.startswith(b"\x7fELF") else None
+            if build_id:
+                debug_file = os.path.join(debug_folder, ".build-id", build_id[:2], f"{build_id[2:]}.debug")
+            else:
+                debug_file = os.path.join(debug_folder, self.name, str(self.version), self.info.package_id(),
+                                          artifact if magic == b"!<arch>\n" else f"{artifact}.debug")
+            debug_file = os.path.abspath(os.path.expanduser(debug_file))
+            mkdir(self, os.path.dirname(debug_file))
+            if magic == b"!<arch>\n":
+                self.run(f"{objcopy}{compress} \"{path}\" \"{debug_file}\"")
+            else:
+                self.run(f"{objcopy} --only-keep-debug{compress} \"{path}\" \"{debug_file}\"")
+        if debug_file and magic.startswith(b"\x7fELF"):
+            self.run(f"{objcopy} --strip-debug --add-gnu-debuglink=\"{debug_file}\" \"{path}\" \"{stripped}\"")
+        else:
+            self.run(f"{objcopy} --strip-debug \"{path}\" \"{stripped}\"")
+        os.replace(stripped, path)
+        kept = f", debug info in {debug_file}" if debug_file else ", debug info dropped (no user.bgfx:debug_folder)"
+        self.output.info(f"{artifact}: {size / 2**20:.1f} MB, {os.path.getsize(path) / 2**20:.1f} MB stripped{kept}")
+
+    def _prebuilt_lib(self, dep, name):
+        cpp_info = self.dependencies[dep].cpp_info.aggregated_components()
+        if name not in cpp_info.libs:
+            return None
+        for lib_dir in cpp_info.libdirs:
+            for lib_file in [f"lib{name}.a", f"{name}.lib"]:
+                if os.path.exists(os.path.join(lib_dir, lib_file)):
+                    return os.path.join(lib_dir, lib_file)
+        return None
+
+    def _use_prebuilt_deps(self, proj_path, config):
+        # Put the Conan provided bx/bimg libs where bgfx's projects expect their own build of them and turn those
+        # projects' rules into no-ops; make warns about the overridden recipes, which is expected
+        overrides = ""
+        for proj, dep in self._prebuilt_projects.items():
+            target = self._make_target(proj_path, proj, config)
+            lib = self._prebuilt_lib(dep, proj)
+            if target is None or lib is None:
+                continue
+            self.output.info(f"Using prebuilt {proj} from {lib}")
+            mkdir(self, os.path.dirname(target))
+            shutil.copy2(lib, target)
+            overrides += f"{proj}:\n\t@echo \"==== Using prebuilt {proj} ====\"\n\n"
+        makefile = os.path.join(self.build_folder, "prebuilt_deps.make")
+        save(self, makefile, overrides)
+        return makefile
+
+    def _generate_compiler_cache(self):
+        launcher = shutil.which(str(self.options.compiler_cache))
+        if launcher is None:
+            raise ConanException(f"compiler_cache={self.options.compiler_cache} but it can't be found in PATH.")
+        env = Environment()
+        cache_dir = self._user_conf("compiler_cache_dir")
+        if cache_dir:
+            env.define_path("CCACHE_DIR" if self.options.compiler_cache == "ccache" else "SCCACHE_DIR", os.path.abspath(cache_dir))
+        rmdir(self, self._compiler_cache_folder)
+        if is_msvc(self):
+            # ccache named cl.exe runs the real cl.exe found further down PATH; build() points MSBuild at it
+            mkdir(self, self._compiler_cache_folder)
+            shutil.copy2(launcher, os.path.join(self._compiler_cache_folder, "cl.exe"))
+        else:
+            # genie's makefiles hardcode the compiler names, so put same named launcher wrappers first in PATH
+            for name in self._compiler_cache_wrapped:
+                compiler = shutil.which(name)
+                if compiler is None:
+                    continue
+                wrapper = os.path.join(self._compiler_cache_folder, name)
+                save(self, wrapper, f"#!/bin/sh\nexec \"{launcher}\" \"{compiler}\" \"$@\"\n")
+                os.chmod(wrapper, 0o755)
+            env.prepend_path("PATH", self._compiler_cache_folder)
+        env.vars(self).save_script("conan_compiler_cache")
+
+    def _compiler_cache_stats(self):
+        # (hits, misses) of the compiler cache so far, or None when there's no cache or its stats can't be read
+        if not self.options.compiler_cache:
+            return None
+        env = dict(os.environ)
+        cache_dir = self._user_conf("compiler_cache_dir")
+        if cache_dir:
+            env["CCACHE_DIR" if self.options.compiler_cache == "ccache" else "SCCACHE_DIR"] = os.path.abspath(cache_dir)
+        try:
+            if self.options.compiler_cache == "ccache":
+                out = subprocess.run(["ccache", "--print-stats"], env=env, capture_output=True, text=True, check=True).stdout
+                stats = dict(line.split("\t", 1) for line in out.splitlines() if "\t" in line)
+                return (int(stats.get("direct_cache_hit", 0)) + int(stats.get("preprocessed_cache_hit", 0)),
+                        int(stats.get("cache_miss", 0)))
+            out = subprocess.run(["sccache", "--show-stats", "--stats-format=json"], env=env, capture_output=True, text=True, check=True).stdout
+            stats = json.loads(out)["stats"]
+            return sum(stats["cache_hits"]["counts"].values()), sum(stats["cache_misses"]["counts"].values())
+        except (OSError, ValueError, KeyError, subprocess.CalledProcessError):
+            return None
 
     def generate(self):
         vbe = VirtualBuildEnv(self)
@@ -214,16 +1181,31 @@ class bgfxConan(ConanFile):
         if is_msvc(self):
             tc = VCVars(self)
             tc.generate()
+            # The genie generated projects know nothing about conan, but cl.exe also takes its options from CL
+            env = Environment()
+            env.append("CL", [f"/D{define}" for define in self._bgfx_config_defines])
+            # _CL_ goes after the project's own options, so it wins over any /arch genie set
+            if self.options.cpu_target == "x86-64-v3":
+                env.append("_CL_", "/arch:AVX2")
+            env.vars(self).save_script("conan_bgfx_cl")
         else:
             tc = AutotoolsToolchain(self)
+            tc.extra_defines.extend(self._bgfx_config_defines)
+            tc.extra_cflags.extend(self._codegen_flags)
+            tc.extra_cxxflags.extend(self._codegen_flags)
+            if self.options.lto:
+                tc.extra_ldflags.extend([flag for flag in self._codegen_flags if flag.startswith("-flto")])
             tc.generate()
+        if self.options.compiler_cache:
+            self._generate_compiler_cache()
 
     def build(self):
-        # Patch rtti
-        if self.options.rtti:
+        compiler_cache_before = self._compiler_cache_stats()
+        # Patch rtti; only once, so a rebuild in the same folder doesn't fail or look like a toolchain change
+        bx_toolchain = os.path.join(self.source_folder, self._bx_folder, "scripts", "toolchain.lua")
+        if self.options.rtti and "\"NoRTTI\"," in load(self, bx_toolchain):
             self.output.info("Disabling no-rtti.")
-            replace_in_file(self, os.path.join(self.source_folder, self._bx_folder, "scripts", "toolchain.lua"),
-                            "\"NoRTTI\",", "")
+            replace_in_file(self, bx_toolchain, "\"NoRTTI\",", "")
         # Patch astcenc
         # if self.settings.arch == "x86" or self.settings_build.arch == "x86":
         #     self.output.info("Disabling ASTCENC_POPCNT.")
@@ -240,14 +1222,28 @@ class bgfxConan(ConanFile):
             # Use genie directly, then msbuild on specific projects based on requirements
             genie_VS = f"vs{vs_ver_to_genie[str(self.settings.compiler.version)]}"
             genie_gen = f"{self._genie_extra} {genie_VS}"
-            self.run(f"genie {genie_gen}", cwd=self._bgfx_path)
+            self._run_genie(genie_gen, os.path.join(self._bgfx_path, ".build", "projects", genie_VS, "bgfx.sln"))
 
+            if self.options.prebuilt_deps:
+                self.output.info("prebuilt_deps is not supported by the MSBuild projects yet; building bx and bimg from source.")
             msbuild = MSBuild(self)
             # customize to Release when RelWithDebInfo
             msbuild.build_type = "Debug" if self.settings.build_type == "Debug" else "Release"
             # use Win32 instead of the default value when building x86
             msbuild.platform = "Win32" if self.settings.arch == "x86" else msbuild.platform
-            msbuild.build(os.path.join(self._bgfx_path, ".build", "projects", genie_VS, "bgfx.sln"), targets=self._projs)
+            msbuild_cmd = msbuild.command(os.path.join(self._bgfx_path, ".build", "projects", genie_VS, "bgfx.sln"), targets=self._projs)
+            # MSBuild only builds projects in parallel when asked to; default to tools.build:jobs like the make path does
+            if self.conf.get("tools.microsoft.msbuild:max_cpu_count", check_type=int) is None:
+                msbuild_cmd += f" -m:{build_jobs(self)}"
+            if self.options.lto:
+                # /GL for cl and /LTCG for link and lib
+                msbuild_cmd += " -p:WholeProgramOptimization=true"
+            if self.options.compiler_cache:
+                msbuild_cmd += f" -p:CLToolExe=cl.exe -p:CLToolPath=\"{self._compiler_cache_folder}\" -p:TrackFileAccess=false"
+            with self._phase("msbuild " + " ".join(self._projs)):
+                self.run(msbuild_cmd)
+            projects_path = os.path.join(self._bgfx_path, ".build", "projects", genie_VS)
+            self._save_artifacts(lambda proj: self._msbuild_target(projects_path, proj, msbuild.build_type, msbuild.platform))
         else:
             # Not sure if XCode can be spefically handled by conan for building through, so assume everything not VS is make
             # gcc-multilib and g++-multilib required for 32bit cross-compilation, should see if we can check and install through conan
@@ -262,7 +1258,10 @@ class bgfxConan(ConanFile):
             gmake_arch_to_genie_suffix = {"x86": "-x86", "x86_64": "-x64", "armv8": "-arm64", "armv7": "-arm"}
             os_to_use_arch_config_suffix = {"Windows": False, "Linux": False, "FreeBSD": False, "Macos": True, "Android": True, "iOS": True}
 
-            build_type_to_make_config = {"Debug": "config=debug", "Release": "config=release"}
+            # genie only knows debug and release. The toolchain's -O2 -g/-Os flags still come through for the other two,
+            # but genie's own -O3 comes later and wins, so RelWithDebInfo only adds -g and MinSizeRel is just Release
+            build_type_to_make_config = {"Debug": "config=debug", "Release": "config=release",
+                                         "RelWithDebInfo": "config=release", "MinSizeRel": "config=release"}
             arch_to_make_config_suffix = {"x86": "32", "x86_64": "64"}
             os_to_use_make_config_suffix = {"Windows": True, "Linux": True, "FreeBSD": True, "Macos": False, "Android": False, "iOS": False}
 
@@ -274,7 +1273,6 @@ class bgfxConan(ConanFile):
                 else:
                     genie_args += f"{gmake_arch_to_genie_suffix[str(self.settings.arch)]}"
             genie_args += " gmake"
-            self.run(f"genie {genie_args}", cwd=self._bgfx_path)
 
             # Build project folder and path from given settings
             proj_folder = f"gmake-{gmake_os_to_proj[str(self.settings.os)]}-{compiler_str}"
@@ -284,6 +1282,7 @@ class bgfxConan(ConanFile):
                 else:
                     proj_folder += gmake_arch_to_genie_suffix[str(self.settings.arch)]
             proj_path = os.path.sep.join([self._bgfx_path, ".build", "projects", proj_folder])
+            self._run_genie(genie_args, os.path.join(proj_path, "Makefile"))
 
             # Build make args from settings
             conf = build_type_to_make_config[str(self.settings.build_type)]
@@ -299,105 +1298,113 @@ class bgfxConan(ConanFile):
                 proj_path = proj_path.replace("\\", "/") # Fix path for linux style...
             else:
                 mingw = ""
+            # Build all targets with a single make so they, and the bx/bimg objects they share, are scheduled together
+            make_args = ["-R", f"-C {proj_path}", mingw, conf, f"-j{build_jobs(self)}"]
+            if self.options.prebuilt_deps:
+                prebuilt_makefile = self._use_prebuilt_deps(proj_path, conf.split("=")[1]).replace("\\", "/")
+                make_args.append(f"-f Makefile -f {prebuilt_makefile}")
+            max_load = self._user_conf("max_load", check_type=float)
+            if max_load:
+                make_args.append(f"-l{max_load}")
+            if self.options.lto and not is_apple_os(self):
+                # Plain ar can't index the symbols of LTO objects. gcc's fat objects still link without the index,
+                # but clang's ThinLTO objects are bitcode only, so an archive made by plain ar is unusable
+                lto_ar = "gcc-ar" if self.settings.compiler == "gcc" else "llvm-ar"
+                if shutil.which(lto_ar):
+                    make_args.append(f"AR={lto_ar}")
+                elif self.settings.compiler != "gcc":
+                    raise ConanException(f"lto=True needs {lto_ar} in PATH to archive clang's ThinLTO objects.")
             autotools = Autotools(self)
-            # Build with make
-            for proj in self._projs:
-                autotools.make(target=proj, args=["-R", f"-C {proj_path}", mingw, conf])
+            with self._phase("make " + " ".join(self._projs)):
+                autotools.make(target=" ".join(self._projs), args=make_args)
+            self._save_artifacts(lambda proj: self._make_target(proj_path, proj, conf.split("=")[1]))
+
+        compiler_cache_after = self._compiler_cache_stats()
+        if compiler_cache_before is not None and compiler_cache_after is not None:
+            hits = compiler_cache_after[0] - compiler_cache_before[0]
+            misses = compiler_cache_after[1] - compiler_cache_before[1]
+            hit_rate = f" ({100 * hits / (hits + misses):.1f}% hit rate)" if hits + misses else ""
+            self.output.highlight(f"{self.options.compiler_cache}: {hits} hits, {misses} misses{hit_rate}")
+        self._report_phases(os.path.join(self.source_folder, "bgfx_phases.json"))
 
     def package(self):
-        # Set platform suffixes and prefixes 
-        if self.settings.os == "Windows" and is_msvc(self):
-            lib_ext = ["*.lib", "*.pdb"]
-            package_lib_prefix = ""
-        else:
-            lib_ext = ["*.a"]
-            if self.options.shared:
-                lib_ext.extend(["*.so"]) # But Linux .so files go in /lib
-            package_lib_prefix = "lib"
-
-        # Get build bin folder
-        for out_dir in os.listdir(os.path.join(self._bgfx_path, ".build")):
-            if not out_dir=="projects":
-                build_bin = os.path.join(self._bgfx_path, ".build", out_dir, "bin")
-                break
-
-        # Copy license
-        copy(self, pattern="LICENSE", dst=os.path.join(self.package_folder, "licenses"), src=self._bgfx_path)
-        # Copy includes
-        copy(self, pattern="*.h", dst=os.path.join(self.package_folder, "include"), src=os.path.join(self._bgfx_path, "include"))
-        copy(self, pattern="*.inl", dst=os.path.join(self.package_folder, "include"), src=os.path.join(self._bgfx_path, "include"))
-        # Copy libs
-        if len(copy(self, pattern=lib_ext[0], dst=os.path.join(self.package_folder, "lib"), src=build_bin, keep_path=False))  < self.expectedNumLibs:
-            raise Exception(self.invalidPackageExceptionText)
-        if self.options.shared:
-            copy(self, pattern="*.dll", dst=os.path.join(self.package_folder, "bin"), src=build_bin, keep_path=False)
-        # Debug info files are optional, so no checking
-        if len(lib_ext) > 1:
-            for ind in range(1, len(lib_ext)):
-                copy(self, pattern=lib_ext[ind], dst=os.path.join(self.package_folder, "lib"), src=build_bin, keep_path=False)
-
-        # Copy tools
-        if self.options.tools:
-            copy(self, pattern="shaderc*", dst=os.path.join(self.package_folder, "bin"), src=build_bin, keep_path=False)
-            copy(self, pattern="texturev*", dst=os.path.join(self.package_folder, "bin"), src=build_bin, keep_path=False)
-            copy(self, pattern="geometryc*", dst=os.path.join(self.package_folder, "bin"), src=build_bin, keep_path=False)
-            copy(self, pattern="geometryv*", dst=os.path.join(self.package_folder, "bin"), src=build_bin, keep_path=False)
-            for bgfxFile in Path(os.path.join(self.package_folder, "bin")).glob("*shaderc*"):
-                rename(self, os.path.join(self.package_folder, "bin", bgfxFile.name), 
-                        os.path.join(self.package_folder, "bin", f"shaderc{bgfxFile.suffix}"))
-            for bgfxFile in Path(os.path.join(self.package_folder, "bin")).glob("*texturev*"):
-                rename(self, os.path.join(self.package_folder, "bin", bgfxFile.name), 
-                        os.path.join(self.package_folder, "bin", f"texturev{bgfxFile.suffix}"))
-            for bgfxFile in Path(os.path.join(self.package_folder, "bin")).glob("*geometryc*"):
-                rename(self, os.path.join(self.package_folder, "bin", bgfxFile.name), 
-                        os.path.join(self.package_folder, "bin", f"geometryc{bgfxFile.suffix}"))
-            for bgfxFile in Path(os.path.join(self.package_folder, "bin")).glob("*geometryv*"):
-                rename(self, os.path.join(self.package_folder, "bin", bgfxFile.name), 
-                        os.path.join(self.package_folder, "bin", f"geometryv{bgfxFile.suffix}"))
-            rm(self, pattern="*shaderc*", folder=os.path.join(self.package_folder, "lib"))
-            rm(self, pattern="*texturev*", folder=os.path.join(self.package_folder, "lib"))
-            rm(self, pattern="*geometryc*", folder=os.path.join(self.package_folder, "lib"))
-            rm(self, pattern="*geometryv*", folder=os.path.join(self.package_folder, "lib"))
-            rm(self, pattern="*example*", folder=os.path.join(self.package_folder, "lib"))
-            rm(self, pattern="*fcpp*", folder=os.path.join(self.package_folder, "lib"))
-            rm(self, pattern="*glsl*", folder=os.path.join(self.package_folder, "lib"))
-            rm(self, pattern="*spirv*", folder=os.path.join(self.package_folder, "lib"))
-
-        # Rename for consistency across platforms and configs
-        if not (is_apple_os(self) and self.options.shared): #Apparently apple dylibs break if renamed
-            for out_file in Path(os.path.join(self.package_folder, "lib")).glob("*bgfx*"):
-                if out_file.suffix != ".pdb":
-                    rename(self, os.path.join(self.package_folder, "lib", out_file.name), 
-                            os.path.join(self.package_folder, "lib", f"{package_lib_prefix}bgfx{out_file.suffix}"))
-        
-        # Delete unwanted output    
-        rm(self, pattern="*bx*", folder=os.path.join(self.package_folder, "lib"))
-        rm(self, pattern="*bimg*", folder=os.path.join(self.package_folder, "lib"))
+        manifest = self._package_manifest()
+        destinations = {}
+        for src, dst, _ in manifest:
+            if dst in destinations:
+                raise ConanException(f"Both {destinations[dst]} and {src} would be packaged as {dst}.")
+            destinations[dst] = src
+        missing = [src for src, _, required in manifest if required and not os.path.isfile(src)]
+        if missing:
+            raise ConanException(f"The build didn't produce {', '.join(missing)}; check the build output for errors.")
+
+        with self._phase("package headers", folders=[self.package_folder]):
+            copy(self, pattern="LICENSE", dst=os.path.join(self.package_folder, "licenses"), src=self._bgfx_path)
+            copy(self, pattern="*.h", dst=os.path.join(self.package_folder, "include"), src=os.path.join(self._bgfx_path, "include"))
+            copy(self, pattern="*.inl", dst=os.path.join(self.package_folder, "include"), src=os.path.join(self._bgfx_path, "include"))
+            # Shader compilation helper, and the headers every bgfx shader includes
+            copy(self, pattern="bgfx_shaders.py", dst=os.path.join(self.package_folder, "res"), src=self.export_sources_folder)
+            copy(self, pattern="bgfx_*.sh", dst=os.path.join(self.package_folder, "res", "shaders"), src=os.path.join(self._bgfx_path, "src"))
+            if self.options.profiler == "trace":
+                copy(self, pattern="bgfx_trace.h", dst=os.path.join(self.package_folder, "include"), src=self.export_sources_folder)
+
+        with self._phase("package artifacts", folders=[self.package_folder]):
+            placed = {}
+            for src, dst, _ in manifest:
+                if os.path.isfile(src):
+                    method = self._place(src, os.path.join(self.package_folder, dst))
+                    placed[method] = placed.get(method, 0) + 1
+            self.output.info("Packaged artifacts: " + ", ".join(f"{count} {method}" for method, count in sorted(placed.items())))
+
+        if self.options.split_debug:
+            with self._phase("package split debug", folders=[self.package_folder]):
+                for _, dst, _ in manifest:
+                    if os.path.isfile(os.path.join(self.package_folder, dst)):
+                        self._split_debug(dst)
+        self._report_phases(os.path.join(self.build_folder, "bgfx_phases.json"))
 
     def package_info(self):
-        self.cpp_info.includedirs = ["include"]
+        # Everything is in the core component, which bgfx::bgfx aggregates
+        core = self.cpp_info.components["core"]
+        core.includedirs = ["include"]
+        core.resdirs = ["res"]
+        core.requires = ["bx::bx", "bimg::bimg", "opengl::opengl"]
         if self.options.shared and self.settings.os in ["Macos", "iOS"]:
-            self.cpp_info.libs = [f"bgfx-shared-lib{self.settings.build_type}"]
+            core.libs = [f"bgfx-shared-lib{'Debug' if self.settings.build_type == 'Debug' else 'Release'}"]
         else:
-            self.cpp_info.libs = ["bgfx"]
+            core.libs = ["bgfx"]
 
         if self.options.shared:
-            self.cpp_info.defines.extend(["BGFX_SHARED_LIB_USE=1"])
+            core.defines.extend(["BGFX_SHARED_LIB_USE=1"])
+        # Let consumers see the limits the library was built with
+        core.defines.extend(self._bgfx_config_defines)
+        if self.options.profiler == "trace":
+            core.defines.append("BGFX_CONAN_TRACE=1")
+        if self.options.lto and not self.options.shared and self.settings.compiler in ["clang", "apple-clang"]:
+            # Thin LTO archives hold bitcode only, so they have to be linked with LTO as well
+            core.exelinkflags.append("-flto=thin")
+            core.sharedlinkflags.append("-flto=thin")
 
         if self.settings.os == "Windows":
-            self.cpp_info.system_libs.extend(["gdi32"])
+            core.system_libs.extend(["gdi32"])
             if not is_msvc(self):
-                self.cpp_info.system_libs.extend(["comdlg32"])
+                core.system_libs.extend(["comdlg32"])
         elif self.settings.os in ["Linux", "FreeBSD"]:
-            self.cpp_info.system_libs.extend(["X11", "GL"])
+            core.system_libs.extend(["X11", "GL"])
         elif self.settings.os in ["Macos", "iOS"]:
-            self.cpp_info.frameworks.extend(["CoreFoundation", "AppKit", "IOKit", "QuartzCore", "Metal"])
+            core.frameworks.extend(["CoreFoundation", "AppKit", "IOKit", "QuartzCore", "Metal"])
             if self.settings.os in ["Macos"]:
-                self.cpp_info.frameworks.extend(["OpenGL"])
+                core.frameworks.extend(["OpenGL"])
             else:
-                self.cpp_info.frameworks.extend(["OpenGLES", "UIKit"])
+                core.frameworks.extend(["OpenGLES", "UIKit"])
         elif self.settings.os in ["Android"]:
-            self.cpp_info.system_libs.extend(["c", "dl", "m", "android", "log", "c++_shared", "EGL", "GLESv2"])
+            core.system_libs.extend(["c", "dl", "m", "android", "log", "c++_shared", "EGL", "GLESv2"])
+
+        # Where to find the shader helper (res/bgfx_shaders.py), the shader headers it needs and shaderc
+        self.conf_info.define("user.bgfx:shaders_helper", os.path.join(self.package_folder, "res", "bgfx_shaders.py"))
+        self.conf_info.define("user.bgfx:shaders_include", os.path.join(self.package_folder, "res", "shaders"))
+        if "shaderc" in self._tools:
+            self.conf_info.define("user.bgfx:shaderc", os.path.join(self.package_folder, "bin", f"shaderc{'.exe' if self.settings.os == 'Windows' else ''}"))
 
         self.cpp_info.set_property("cmake_file_name", "bgfx")
         self.cpp_info.set_property("cmake_target_name", "bgfx::bgfx")
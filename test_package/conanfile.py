@@ -1,8 +1,12 @@
 from conan import ConanFile
 from conan.tools.build import can_run
 from conan.tools.microsoft import is_msvc
-from conan.tools.layout import cmake_layout
-from conan.tools.cmake import CMake
+from conan.tools.cmake import CMake, cmake_layout
+from conan.tools.files import load
+from conan.errors import ConanException
+from pathlib import Path
+import importlib.util
+import json
 import os
 
 required_conan_version = ">=1.50.0"
@@ -28,3 +32,92 @@ class TestPackageConan(ConanFile):
         if can_run(self):
             bin_path = os.path.join(self.cpp.build.bindirs[0], "test_package")
             self.run(bin_path, env="conanrun")
+            self._check_codegen_flags()
+            self._compile_shaders()
+            if str(self.dependencies["bgfx"].options.get_safe("profiler")) == "trace":
+                self._trace(bin_path)
+            if self.conf.get("user.bgfx:benchmark", default=False, check_type=bool):
+                self._benchmark(bin_path)
+
+    def _check_codegen_flags(self):
+        # With lto or a cpu_target, the recipe records the compiler command line in the ELF binaries it builds
+        bgfx = self.dependencies["bgfx"]
+        expected = []
+        cpu_target = bgfx.options.get_safe("cpu_target", "baseline")
+        if cpu_target == "native":
+            # gcc records the -march=native expanded to the build machine's cpu (e.g. -march=cooperlake)
+            expected.append("-march=")
+        elif cpu_target != "baseline":
+            expected.append(f"-march={cpu_target}")
+        if bgfx.options.get_safe("lto", False):
+            expected.append("-flto")
+        if not expected or is_msvc(self) or self.settings.os not in ["Linux", "FreeBSD", "Android"]:
+            return
+        libs = [lib for libdir in bgfx.cpp_info.libdirs for lib in Path(libdir).glob("*bgfx*") if lib.suffix in [".a", ".so"]]
+        if not libs:
+            raise ConanException("No bgfx library found to check the code generation flags on")
+        for lib in libs:
+            content = lib.read_bytes()
+            missing = [flag for flag in expected if flag.encode() not in content]
+            if missing:
+                raise ConanException(f"{lib.name} wasn't built with {' '.join(missing)}")
+        self.output.info(f"Checked {', '.join(lib.name for lib in libs)} for {' '.join(expected)}")
+
+    def _compile_shaders(self):
+        # Packages with shaderc also ship the shader helper; compile twice, the second time should all come from its cache
+        bgfx = self.dependencies["bgfx"]
+        shaderc = os.path.join(bgfx.package_folder, "bin", "shaderc.exe" if self.settings.os == "Windows" else "shaderc")
+        if not os.path.exists(shaderc):
+            return
+        spec = importlib.util.spec_from_file_location("bgfx_shaders", os.path.join(bgfx.package_folder, "res", "bgfx_shaders.py"))
+        bgfx_shaders = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(bgfx_shaders)
+        shaders = [os.path.join(self.source_folder, "shaders", name) for name in ["vs_test.sc", "fs_test.sc"]]
+        kwargs = {"shaderc": shaderc, "include_dirs": [os.path.join(bgfx.package_folder, "res", "shaders")],
+                  "cache_folder": os.path.join(self.build_folder, "shader_cache")}
+        try:
+            first = bgfx_shaders.compile_shaders(shaders, ["glsl", "spirv"], os.path.join(self.build_folder, "shaders"), **kwargs)
+            second = bgfx_shaders.compile_shaders(shaders, ["glsl", "spirv"], os.path.join(self.build_folder, "shaders"), **kwargs)
+        except RuntimeError as e:
+            raise ConanException(f"Shader compilation failed: {e}")
+        self.output.info(f"Shaders: {first['compiled']} compiled, {first['cached']} cached; then {second['cached']} cached")
+        if second["compiled"]:
+            raise ConanException(f"{second['compiled']} unchanged shaders were compiled again instead of coming from the cache")
+
+    def _trace(self, bin_path):
+        trace_path = os.path.join(self.build_folder, "bgfx_trace.json")
+        self.run(f"{bin_path} --trace \"{trace_path}\"", env="conanrun")
+        events = json.loads(load(self, trace_path))["traceEvents"]
+        if not events:
+            raise ConanException(f"{trace_path} has no profiler events; was bgfx built with BGFX_CONFIG_PROFILER?")
+        totals = {}
+        for event in events:
+            totals[event["name"]] = totals.get(event["name"], 0.0) + event["dur"]
+        self.output.info(f"{len(events)} profiler events in {trace_path}; most time spent in:")
+        for name, total in sorted(totals.items(), key=lambda item: -item[1])[:5]:
+            self.output.info(f"  {name:<40} {total / 1000:>10.3f} ms")
+
+    def _benchmark(self, bin_path):
+        results_path = os.path.join(self.build_folder, "bgfx_benchmark.json")
+        self.run(f"{bin_path} --bench \"{results_path}\"", env="conanrun")
+        results = json.loads(load(self, results_path))
+        self.output.info(f"Benchmark results written to {results_path}")
+
+        baseline_path = self.conf.get("user.bgfx:benchmark_baseline")
+        baseline = json.loads(load(self, baseline_path))["metrics"] if baseline_path else {}
+        tolerance = float(self.conf.get("user.bgfx:benchmark_tolerance", default=0.1))
+        regressions = []
+        self.output.info(f"{'metric':<28} {'value':>14} {'baseline':>14} {'change':>8}")
+        for name, value in results["metrics"].items():
+            base = baseline.get(name)
+            if not base:
+                self.output.info(f"{name:<28} {value:>14.4g} {'-':>14} {'-':>8}")
+                continue
+            change = (value - base) / base
+            # Throughputs regress when they drop, latencies when they grow
+            regression = -change if name.endswith("_per_sec") else change
+            self.output.info(f"{name:<28} {value:>14.4g} {base:>14.4g} {change:>+8.1%}")
+            if regression > tolerance:
+                regressions.append(name)
+        if regressions:
+            raise ConanException(f"Benchmark regressed by more than {tolerance:.0%} against {baseline_path}: {', '.join(regressions)}")
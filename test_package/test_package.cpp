@@ -1,7 +1,28 @@
 #include <bgfx/bgfx.h>
+#if defined(BGFX_CONAN_TRACE)
+#include <bgfx_trace.h>
+#endif
 
-int main() {
-    bgfx::Init init;
+#include <algorithm>
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <cstdio>
+#include <cstring>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+namespace {
+
+using Clock = std::chrono::steady_clock;
+
+double secondsSince(Clock::time_point start) {
+	return std::chrono::duration<double>(Clock::now() - start).count();
+}
+
+bgfx::Init noopInit(uint16_t maxEncoders = 0) {
+	bgfx::Init init;
 	init.type     = bgfx::RendererType::Noop;
 	init.vendorId = BGFX_PCI_ID_NONE;
 	init.platformData.nwh  = nullptr;
@@ -9,7 +30,313 @@ int main() {
 	init.resolution.width  = 0;
 	init.resolution.height = 0;
 	init.resolution.reset  = BGFX_RESET_NONE;
-	bgfx::init(init);
-    bgfx::shutdown();
-    return 0;
+	if (maxEncoders != 0) {
+		init.limits.maxEncoders = maxEncoders;
+	}
+	return init;
+}
+
+struct PosColorVertex {
+	float x, y, z;
+	uint32_t abgr;
+};
+
+const PosColorVertex kQuadVertices[] = {
+	{-1.0f,  1.0f, 0.0f, 0xff0000ff},
+	{ 1.0f,  1.0f, 0.0f, 0xff00ff00},
+	{-1.0f, -1.0f, 0.0f, 0xffff0000},
+	{ 1.0f, -1.0f, 0.0f, 0xffffffff},
+};
+
+const uint16_t kQuadIndices[] = {0, 1, 2, 1, 3, 2};
+
+bgfx::VertexLayout posColorLayout() {
+	bgfx::VertexLayout layout;
+	layout.begin()
+		.add(bgfx::Attrib::Position, 3, bgfx::AttribType::Float)
+		.add(bgfx::Attrib::Color0, 4, bgfx::AttribType::Uint8, true)
+		.end();
+	return layout;
+}
+
+// Submits one quad from transient buffers. There is no program: the Noop renderer doesn't draw anything anyway, and
+// this keeps the measurement on bgfx's CPU side submission path (transient allocation, state, sort key, commit).
+bool submitQuad(bgfx::Encoder* encoder, const bgfx::VertexLayout& layout) {
+	bgfx::TransientVertexBuffer tvb;
+	bgfx::TransientIndexBuffer tib;
+	if (!bgfx::allocTransientBuffers(&tvb, layout, 4, &tib, 6)) {
+		return false;
+	}
+	std::memcpy(tvb.data, kQuadVertices, sizeof(kQuadVertices));
+	std::memcpy(tib.data, kQuadIndices, sizeof(kQuadIndices));
+	encoder->setVertexBuffer(0, &tvb);
+	encoder->setIndexBuffer(&tib);
+	encoder->setState(BGFX_STATE_DEFAULT);
+	encoder->submit(0, BGFX_INVALID_HANDLE);
+	return true;
+}
+
+const int kInitIterations = 10;
+const int kFrames = 200;
+const int kDrawsPerFrame = 2000;
+const int kEncoderFrames = 50;
+const int kEncoderWarmupFrames = 5;
+
+// Threads kept alive for a whole encoder scaling run, each submitting one frame's worth of draws with its own encoder
+// per round. A round times the span from the first begin() to the last end(), so neither starting the threads nor
+// waking them up is measured.
+class EncoderThreads {
+public:
+	EncoderThreads(unsigned int count, const bgfx::VertexLayout& layout)
+		: m_layout(layout)
+		, m_slots(count) {
+		for (unsigned int t = 0; t < count; ++t) {
+			m_threads.emplace_back([this, t]() { work(t); });
+		}
+	}
+
+	~EncoderThreads() {
+		{
+			std::lock_guard<std::mutex> lock(m_mutex);
+			m_quit = true;
+			++m_round;
+		}
+		m_start.notify_all();
+		for (std::thread& thread : m_threads) {
+			thread.join();
+		}
+	}
+
+	double round() {
+		std::unique_lock<std::mutex> lock(m_mutex);
+		m_pending = unsigned(m_slots.size());
+		++m_round;
+		m_start.notify_all();
+		m_done.wait(lock, [this]() { return m_pending == 0; });
+		Clock::time_point first = m_slots[0].start;
+		Clock::time_point last = m_slots[0].end;
+		for (const Slot& slot : m_slots) {
+			first = std::min(first, slot.start);
+			last = std::max(last, slot.end);
+		}
+		return std::chrono::duration<double>(last - first).count();
+	}
+
+	// Only called between rounds, while every thread waits for the next one
+	long long draws() const {
+		long long total = 0;
+		for (const Slot& slot : m_slots) {
+			total += slot.draws;
+		}
+		return total;
+	}
+
+	void resetDraws() {
+		for (Slot& slot : m_slots) {
+			slot.draws = 0;
+		}
+	}
+
+private:
+	struct Slot {
+		Clock::time_point start;
+		Clock::time_point end;
+		long long draws = 0;
+	};
+
+	void work(unsigned int t) {
+		uint64_t seen = 0;
+		for (;;) {
+			{
+				std::unique_lock<std::mutex> lock(m_mutex);
+				m_start.wait(lock, [this, seen]() { return m_round != seen; });
+				seen = m_round;
+				if (m_quit) {
+					return;
+				}
+			}
+			Slot& slot = m_slots[t];
+			slot.start = Clock::now();
+			bgfx::Encoder* encoder = bgfx::begin(true);
+			if (encoder != nullptr) {
+				for (int j = 0; j < kDrawsPerFrame; ++j) {
+					slot.draws += submitQuad(encoder, m_layout) ? 1 : 0;
+				}
+				bgfx::end(encoder);
+			}
+			slot.end = Clock::now();
+			{
+				std::lock_guard<std::mutex> lock(m_mutex);
+				if (--m_pending == 0) {
+					m_done.notify_one();
+				}
+			}
+		}
+	}
+
+	const bgfx::VertexLayout& m_layout;
+	std::mutex m_mutex;
+	std::condition_variable m_start;
+	std::condition_variable m_done;
+	uint64_t m_round = 0;
+	unsigned int m_pending = 0;
+	bool m_quit = false;
+	std::vector<Slot> m_slots;
+	std::vector<std::thread> m_threads;
+};
+
+struct Metric {
+	const char* name;
+	double value;
+};
+
+int runBenchmark(const char* jsonPath) {
+	std::vector<Metric> metrics;
+
+	// Init/shutdown latency
+	double initSeconds = 0.0;
+	double shutdownSeconds = 0.0;
+	for (int i = 0; i < kInitIterations; ++i) {
+		Clock::time_point start = Clock::now();
+		if (!bgfx::init(noopInit())) {
+			std::fprintf(stderr, "bgfx::init failed\n");
+			return 1;
+		}
+		initSeconds += secondsSince(start);
+		start = Clock::now();
+		bgfx::shutdown();
+		shutdownSeconds += secondsSince(start);
+	}
+	metrics.push_back({"init_ms", 1000.0 * initSeconds / kInitIterations});
+	metrics.push_back({"shutdown_ms", 1000.0 * shutdownSeconds / kInitIterations});
+
+	const unsigned int hardwareThreads = std::max(1u, std::thread::hardware_concurrency());
+#if defined(BGFX_CONFIG_MULTITHREADED) && BGFX_CONFIG_MULTITHREADED == 0
+	// Built with multithreaded=False: there's only encoder 0
+	const uint16_t maxEncoders = 1;
+#else
+	const uint16_t maxEncoders = uint16_t(std::min(hardwareThreads, 8u) + 1);
+#endif
+	if (!bgfx::init(noopInit(maxEncoders))) {
+		std::fprintf(stderr, "bgfx::init failed\n");
+		return 1;
+	}
+	// One encoder per thread, besides encoder 0 of the API thread. A single threaded bgfx hands every thread encoder 0,
+	// so there it's only safe to use from one thread at a time, while the API thread waits
+	const uint32_t encoderLimit = bgfx::getCaps()->limits.maxEncoders;
+	const unsigned int maxEncoderThreads = encoderLimit <= 1 ? 1u : std::min({hardwareThreads, 8u, unsigned(encoderLimit - 1)});
+	const bgfx::VertexLayout layout = posColorLayout();
+
+	// Empty frame() overhead
+	Clock::time_point start = Clock::now();
+	for (int i = 0; i < kFrames; ++i) {
+		bgfx::frame();
+	}
+	metrics.push_back({"frame_us", 1e6 * secondsSince(start) / kFrames});
+
+	// Single thread submit throughput, frame() excluded
+	double submitSeconds = 0.0;
+	double frameSeconds = 0.0;
+	long long draws = 0;
+	for (int i = 0; i < kFrames; ++i) {
+		start = Clock::now();
+		bgfx::Encoder* encoder = bgfx::begin();
+		for (int j = 0; j < kDrawsPerFrame; ++j) {
+			draws += submitQuad(encoder, layout) ? 1 : 0;
+		}
+		bgfx::end(encoder);
+		submitSeconds += secondsSince(start);
+		start = Clock::now();
+		bgfx::frame();
+		frameSeconds += secondsSince(start);
+	}
+	metrics.push_back({"submit_draws_per_sec", draws / submitSeconds});
+	metrics.push_back({"frame_with_draws_us", 1e6 * frameSeconds / kFrames});
+
+	// Encoder scaling: the same per thread work from 1..N threads each with its own encoder
+	static const char* const kEncoderMetricNames[] = {
+		"encoder_1_draws_per_sec", "encoder_2_draws_per_sec", "encoder_4_draws_per_sec", "encoder_8_draws_per_sec",
+	};
+	for (unsigned int threadCount = 1, metric = 0; threadCount <= maxEncoderThreads; threadCount *= 2, ++metric) {
+		EncoderThreads threads(threadCount, layout);
+		// Untimed rounds first, so the transient buffers and the encoders' first use aren't part of the measurement
+		for (int i = 0; i < kEncoderWarmupFrames; ++i) {
+			threads.round();
+			bgfx::frame();
+		}
+		threads.resetDraws();
+		submitSeconds = 0.0;
+		for (int i = 0; i < kEncoderFrames; ++i) {
+			submitSeconds += threads.round();
+			bgfx::frame();
+		}
+		const long long total = threads.draws();
+		metrics.push_back({kEncoderMetricNames[metric], total / submitSeconds});
+	}
+	bgfx::shutdown();
+
+	FILE* json = std::fopen(jsonPath, "w");
+	if (json == nullptr) {
+		std::fprintf(stderr, "Can't write %s\n", jsonPath);
+		return 1;
+	}
+	std::fprintf(json, "{\n \"renderer\": \"Noop\",\n \"bgfx_api_version\": %d,\n \"draws_per_frame\": %d,\n \"metrics\": {", BGFX_API_VERSION, kDrawsPerFrame);
+	for (size_t i = 0; i < metrics.size(); ++i) {
+		std::fprintf(json, "%s\n  \"%s\": %.6g", i == 0 ? "" : ",", metrics[i].name, metrics[i].value);
+	}
+	std::fprintf(json, "\n }\n}\n");
+	std::fclose(json);
+	return 0;
+}
+
+#if defined(BGFX_CONAN_TRACE)
+const int kTraceFrames = 20;
+
+// Records bgfx's profiler scopes over a few frames of draws and writes them as a Chrome trace
+int runTrace(const char* jsonPath) {
+	bgfx_trace::Recorder recorder;
+	bgfx::Init init = noopInit();
+	init.callback = &recorder;
+	if (!bgfx::init(init)) {
+		std::fprintf(stderr, "bgfx::init failed\n");
+		return 1;
+	}
+	const bgfx::VertexLayout layout = posColorLayout();
+	for (int i = 0; i < kTraceFrames; ++i) {
+		bgfx::Encoder* encoder = bgfx::begin();
+		for (int j = 0; j < kDrawsPerFrame; ++j) {
+			submitQuad(encoder, layout);
+		}
+		bgfx::end(encoder);
+		bgfx::frame();
+	}
+	bgfx::shutdown();
+	if (!recorder.writeChromeTrace(jsonPath)) {
+		std::fprintf(stderr, "Can't write %s\n", jsonPath);
+		return 1;
+	}
+	std::printf("Recorded %zu profiler events (%llu dropped) to %s\n", recorder.events().size(), (unsigned long long)recorder.dropped(), jsonPath);
+	return 0;
+}
+#endif
+
+} // namespace
+
+int main(int argc, char** argv) {
+	// test_package --bench <results.json> runs the benchmark suite, --trace <trace.json> records a profiler trace
+	// (profiler=trace packages only), otherwise this only checks that bgfx links and runs
+	if (argc == 3 && std::strcmp(argv[1], "--bench") == 0) {
+		return runBenchmark(argv[2]);
+	}
+	if (argc == 3 && std::strcmp(argv[1], "--trace") == 0) {
+#if defined(BGFX_CONAN_TRACE)
+		return runTrace(argv[2]);
+#else
+		std::fprintf(stderr, "bgfx wasn't packaged with profiler=trace\n");
+		return 1;
+#endif
+	}
+	bgfx::init(noopInit());
+	bgfx::shutdown();
+	return 0;
 }
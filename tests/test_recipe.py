@@ -0,0 +1,636 @@
+"""Scenario tests for the recipe's source handling, run with pytest from the repository root.
+
+Everything is local: upstream repos are file:// repos made in a temporary folder, so no network is needed.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import time
+import types
+
+import pytest
+
+RECIPE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "conanfile.py")
+
+
+def _load_recipe():
+    spec = importlib.util.spec_from_file_location("bgfx_recipe", RECIPE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+recipe = _load_recipe()
+
+
+def git(folder, *args):
+    return subprocess.run(["git", *args], cwd=folder, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def commit(work, message):
+    # One file per commit, so branches always merge cleanly
+    name = message.replace(" ", "_")
+    with open(os.path.join(work, name), "w") as f:
+        f.write(f"{message}\n")
+    git(work, "add", name)
+    git(work, "commit", "-q", "-m", message)
+    return git(work, "rev-parse", "HEAD")
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch):
+    for var in ["GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"]:
+        monkeypatch.setenv(var, "test")
+    for var in ["GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"]:
+        monkeypatch.setenv(var, "test@example.com")
+    for var in ["BGFX_CONAN_CACHE_FOLDER", "BGFX_CONAN_SOURCE_STORE", "BGFX_CONAN_CACHE_MAX_AGE_DAYS", "BGFX_CONAN_CACHE_MAX_SIZE_MB"]:
+        monkeypatch.delenv(var, raising=False)
+
+
+def make_upstream(tmp_path, name, commits):
+    """A bare upstream repo with commits on master, and a working copy that pushes to it."""
+    bare = tmp_path / f"{name}.git"
+    work = tmp_path / f"{name}-work"
+    git(tmp_path, "init", "-q", "--bare", "-b", "master", str(bare))
+    git(tmp_path, "clone", "-q", str(bare), str(work))
+    git(work, "checkout", "-q", "-b", "master")
+    for i in range(commits):
+        commit(work, f"{name} {i}")
+    git(work, "push", "-q", "origin", "master")
+    return bare.as_uri(), str(work)
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    return make_upstream(tmp_path, "upstream", 5)
+
+
+@pytest.fixture
+def conanfile(tmp_path, monkeypatch):
+    monkeypatch.setenv("BGFX_CONAN_CACHE_FOLDER", str(tmp_path / "cache"))
+    return recipe.bgfxConan(display_name="bgfx")
+
+
+def merge_side_branch(work, commits):
+    git(work, "checkout", "-q", "-b", "side", "HEAD~2")
+    for i in range(commits):
+        commit(work, f"side {i}")
+    git(work, "checkout", "-q", "master")
+    commit(work, "master before merge")
+    git(work, "merge", "-q", "--no-ff", "-m", "merge side", "side")
+    git(work, "push", "-q", "origin", "master")
+
+
+def version_of(work, rev):
+    return recipe.bgfxConan._version_from_count(int(git(work, "rev-list", "--count", rev)))
+
+
+def update_index(conanfile, url):
+    mirror = conanfile._update_mirror(url)
+    return conanfile._update_version_index(url, mirror)
+
+
+def test_version_index_labels_commits_by_their_own_count(conanfile, upstream):
+    url, work = upstream
+    merge_side_branch(work, 3)
+    versions = update_index(conanfile, url)["versions"]
+    first_parents = git(work, "rev-list", "--first-parent", "master").split()
+    assert sorted(versions.values()) == sorted(first_parents)
+    for sha in first_parents:
+        assert versions[version_of(work, sha)] == sha
+
+
+def test_version_index_is_the_same_built_incrementally_or_at_once(conanfile, upstream, tmp_path, monkeypatch):
+    url, work = upstream
+    update_index(conanfile, url)
+    merge_side_branch(work, 3)
+    commit(work, "after merge")
+    git(work, "push", "-q", "origin", "master")
+    incremental = update_index(conanfile, url)
+
+    monkeypatch.setenv("BGFX_CONAN_CACHE_FOLDER", str(tmp_path / "fresh_cache"))
+    fresh = update_index(recipe.bgfxConan(display_name="bgfx"), url)
+    assert incremental == fresh
+    assert incremental["count"] == int(git(work, "rev-list", "--count", "master"))
+
+
+def test_version_index_is_replaced_not_rewritten_in_place(conanfile, upstream):
+    url, work = upstream
+    update_index(conanfile, url)
+    with open(conanfile._version_index_path) as reader:
+        # A job that opened the index just before an update still reads the whole previous index
+        commit(work, "new")
+        git(work, "push", "-q", "origin", "master")
+        update_index(conanfile, url)
+        assert json.load(reader)[url]["count"] == 5
+    assert json.loads(open(conanfile._version_index_path).read())[url]["count"] == 6
+    assert [name for name in os.listdir(conanfile._cache_folder) if name.endswith(".partial")] == []
+
+
+def test_version_index_rebuilds_older_formats(conanfile, upstream):
+    url, work = upstream
+    head = git(work, "rev-parse", "master")
+    os.makedirs(conanfile._cache_folder)
+    with open(conanfile._version_index_path, "w") as f:
+        json.dump({url: {"head": head, "count": 5, "versions": {"1.0.5": "0" * 40}}}, f)
+    assert update_index(conanfile, url)["versions"]["1.0.5"] == head
+
+
+@pytest.mark.parametrize("cached", [True, False])
+def test_clone_version_gets_the_indexed_commit(upstream, tmp_path, monkeypatch, cached):
+    url, work = upstream
+    merge_side_branch(work, 3)
+    commit(work, "after merge")
+    git(work, "push", "-q", "origin", "master")
+    if cached:
+        monkeypatch.setenv("BGFX_CONAN_CACHE_FOLDER", str(tmp_path / "cache"))
+    conanfile = recipe.bgfxConan(display_name="bgfx")
+    for rev in ["master", "master~1", "master~3"]:
+        folder = tmp_path / f"clone-{rev.replace('~', '-')}"
+        conanfile.cloneVersion(str(folder), url, version_of(work, rev))
+        assert git(folder, "rev-parse", "HEAD") == git(work, "rev-parse", rev)
+
+
+def age_mirror(mirror, days):
+    old = time.time() - days * 86400
+    os.utime(f"{mirror}.stamp", (old, old))
+
+
+def test_mirrors_being_read_are_not_evicted(conanfile, tmp_path, monkeypatch):
+    monkeypatch.setenv("BGFX_CONAN_CACHE_MAX_AGE_DAYS", "1")
+    (bx, _), (bimg, _) = make_upstream(tmp_path, "bx", 3), make_upstream(tmp_path, "bimg", 3)
+    with conanfile._read_mirror(bx) as mirror:
+        age_mirror(mirror, 2)
+        conanfile._update_mirror(bimg)
+        assert os.path.isdir(mirror)
+        assert git(mirror, "rev-list", "--count", "master") == "3"
+    conanfile._update_mirror(bimg)
+    assert not os.path.exists(mirror)
+    assert not os.path.exists(f"{mirror}.stamp")
+
+
+def test_read_mirror_updates_a_mirror_evicted_before_it_was_locked(conanfile, upstream, monkeypatch):
+    url, _ = upstream
+    update_mirror = conanfile._update_mirror
+    evictions = []
+
+    def update_then_evict(url):
+        mirror = update_mirror(url)
+        if not evictions:
+            # Another job evicting the mirror between its update and the read lock
+            evictions.append(mirror)
+            recipe.rmdir(conanfile, mirror)
+        return mirror
+
+    monkeypatch.setattr(conanfile, "_update_mirror", update_then_evict)
+    with conanfile._read_mirror(url) as mirror:
+        assert evictions == [mirror]
+        assert git(mirror, "rev-list", "--count", "master") == "5"
+
+
+def test_version_lookup_reads_the_mirror_under_lock(conanfile, upstream):
+    url, work = upstream
+    assert conanfile._latest_commit_count(url) == 5
+    commit(work, "new")
+    git(work, "push", "-q", "origin", "master")
+    assert conanfile._commit_for_version(url, version_of(work, "master")) == git(work, "rev-parse", "master")
+    with pytest.raises(recipe.ConanException, match="does not exist"):
+        conanfile._commit_for_version(url, "1.0.99")
+
+
+class FakeSettings:
+    def __init__(self, **values):
+        self._values = values
+
+    def get_safe(self, name, default=None):
+        return self._values.get(name, default)
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class EmptyConf:
+    def get(self, name, default=None, check_type=None):
+        return default
+
+
+FAKE_CCACHE = """#!/bin/sh
+if [ "$1" = "--print-stats" ]; then
+    printf 'direct_cache_hit\\t3\\npreprocessed_cache_hit\\t1\\ncache_miss\\t2\\n'
+    exit 0
+fi
+echo "CCACHE_DIR=$CCACHE_DIR $*" >> "$(dirname "$0")/launched.log"
+exec "$@"
+"""
+
+
+@pytest.fixture
+def ccache(tmp_path, monkeypatch):
+    """A stand-in ccache first in PATH, which logs every compiler it launches and then runs it."""
+    folder = tmp_path / "launcher"
+    folder.mkdir()
+    launcher = folder / "ccache"
+    launcher.write_text(FAKE_CCACHE)
+    launcher.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{folder}{os.pathsep}{os.environ['PATH']}")
+    return folder / "launched.log"
+
+
+def configured(os_name="Linux", compiler="gcc", compiler_cache="ccache", generators_folder=None):
+    conanfile = recipe.bgfxConan(display_name="bgfx")
+    conanfile.settings = conanfile.settings_build = FakeSettings(os=os_name, compiler=compiler, arch="x86_64", build_type="Release")
+    conanfile.conf = EmptyConf()
+    conanfile.options.compiler_cache = compiler_cache
+    if generators_folder:
+        conanfile.folders.set_base_generators(str(generators_folder))
+    return conanfile
+
+
+@pytest.mark.skipif(os.name == "nt" or not shutil.which("gcc"), reason="needs gcc and a POSIX shell")
+def test_compiler_cache_wraps_the_compilers_genie_calls(ccache, tmp_path, monkeypatch):
+    monkeypatch.setenv("BGFX_CONAN_COMPILER_CACHE_DIR", str(tmp_path / "ccache_dir"))
+    generators = tmp_path / "generators"
+    configured(generators_folder=generators)._generate_compiler_cache()
+    source = tmp_path / "hello.c"
+    source.write_text("int hello(void) { return 42; }\n")
+    script = generators / "conan_compiler_cache.sh"
+    subprocess.run(["sh", "-c", f". '{script}' && gcc -c '{source}' -o '{tmp_path / 'hello.o'}'"], check=True)
+    assert (tmp_path / "hello.o").exists()
+    launched = ccache.read_text().splitlines()
+    assert launched == [f"CCACHE_DIR={tmp_path / 'ccache_dir'} {shutil.which('gcc')} -c {source} -o {tmp_path / 'hello.o'}"]
+
+
+def test_compiler_cache_stats(ccache):
+    assert configured()._compiler_cache_stats() == (4, 2)
+    assert configured(compiler_cache=None)._compiler_cache_stats() is None
+
+
+def test_compiler_cache_is_rejected_for_mingw():
+    with pytest.raises(recipe.ConanInvalidConfiguration, match="mingw"):
+        configured(os_name="Windows", compiler="gcc").validate_build()
+
+
+def sha256_of(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A source store with a bx bundle and a gzipped bimg tarball, both made from local repos."""
+    folder = tmp_path / "store"
+    folder.mkdir()
+    _, bx = make_upstream(tmp_path, "bx", 3)
+    git(bx, "bundle", "create", str(folder / "bx.bundle"), "--all")
+    _, bimg = make_upstream(tmp_path, "bimg", 2)
+    bimg_head = git(bimg, "rev-parse", "HEAD")
+    archive = subprocess.run(["git", "archive", "--format=tar.gz", f"--prefix=bimg-{bimg_head}/", bimg_head],
+                             cwd=bimg, check=True, capture_output=True).stdout
+    (folder / "bimg.tar.gz").write_bytes(archive)
+    manifest = {"bx": {"1.0.2": {"file": "bx.bundle", "sha256": sha256_of(folder / "bx.bundle"), "commit": git(bx, "rev-parse", "HEAD~1")}},
+                "bimg": {"1.0.2": {"file": "bimg.tar.gz", "sha256": sha256_of(folder / "bimg.tar.gz")}}}
+    (folder / "manifest.json").write_text(json.dumps(manifest))
+    return folder, manifest
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    # Store entries are looked up by the folder name cloneVersion gets, relative to the source folder
+    folder = tmp_path / "src"
+    folder.mkdir()
+    monkeypatch.chdir(folder)
+    return folder
+
+
+def store_conanfile(monkeypatch, store_folder, cache_folder=None):
+    monkeypatch.setenv("BGFX_CONAN_SOURCE_STORE", str(store_folder))
+    if cache_folder:
+        monkeypatch.setenv("BGFX_CONAN_CACHE_FOLDER", str(cache_folder))
+    return recipe.bgfxConan(display_name="bgfx")
+
+
+def test_store_bundle_is_checked_out_at_its_commit(store, sources, tmp_path, monkeypatch):
+    store_folder, manifest = store
+    conanfile = store_conanfile(monkeypatch, store_folder, tmp_path / "cache")
+    conanfile.cloneVersion("bx", "unused://bx", "1.0.2")
+    assert git(sources / "bx", "rev-parse", "HEAD") == manifest["bx"]["1.0.2"]["commit"]
+    assert sorted(os.listdir(sources / "bx")) == [".git", "bx_0", "bx_1"]
+    assert len(os.listdir(tmp_path / "cache" / "trees")) == 1
+
+
+def test_store_tarball_is_extracted_and_reused(store, sources, tmp_path, monkeypatch):
+    store_folder, _ = store
+    conanfile = store_conanfile(monkeypatch, store_folder, tmp_path / "cache")
+    conanfile.cloneVersion("bimg", "unused://bimg", "1.0.2")
+    assert sorted(os.listdir(sources / "bimg")) == ["bimg_0", "bimg_1"]
+    # The second time the cached tree is copied; the store file isn't even read
+    (store_folder / "bimg.tar.gz").write_bytes(b"")
+    shutil.rmtree(sources / "bimg")
+    conanfile.cloneVersion("bimg", "unused://bimg", "1.0.2")
+    assert sorted(os.listdir(sources / "bimg")) == ["bimg_0", "bimg_1"]
+
+
+def test_store_is_only_read_without_a_cache_folder(store, sources, monkeypatch):
+    store_folder, _ = store
+    before = sorted(os.listdir(store_folder))
+    conanfile = store_conanfile(monkeypatch, store_folder)
+    conanfile.cloneVersion("bimg", "unused://bimg", "1.0.2")
+    conanfile.cloneVersion("bx", "unused://bx", "1.0.2")
+    assert sorted(os.listdir(sources / "bimg")) == ["bimg_0", "bimg_1"]
+    assert sorted(os.listdir(store_folder)) == before
+
+
+@pytest.mark.parametrize("repo", ["bx", "bimg"])
+@pytest.mark.parametrize("data_filter", [True, False])
+def test_store_hash_mismatch_fails_and_keeps_nothing(store, sources, tmp_path, monkeypatch, repo, data_filter):
+    store_folder, manifest = store
+    manifest[repo]["1.0.2"]["sha256"] = "0" * 64
+    (store_folder / "manifest.json").write_text(json.dumps(manifest))
+    if not data_filter:
+        # Without the data filter, nothing may be unpacked before the hash is known to match
+        monkeypatch.delattr(recipe.tarfile, "data_filter", raising=False)
+        monkeypatch.setattr(recipe.tarfile, "open", lambda *args, **kwargs: pytest.fail("extracted before checking the hash"))
+    elif not hasattr(recipe.tarfile, "data_filter"):
+        pytest.skip("this Python's tarfile has no data filter")
+    conanfile = store_conanfile(monkeypatch, store_folder, tmp_path / "cache")
+    with pytest.raises(recipe.ConanException, match="sha256"):
+        conanfile.cloneVersion(repo, f"unused://{repo}", "1.0.2")
+    assert os.listdir(sources / repo) == []
+    assert os.listdir(tmp_path / "cache" / "trees") == []
+
+
+def test_first_parent_with_count_matches_the_index(conanfile, upstream):
+    url, work = upstream
+    merge_side_branch(work, 3)
+    commit(work, "after merge")
+    git(work, "push", "-q", "origin", "master")
+    versions = update_index(conanfile, url)["versions"]
+    head_count = int(git(work, "rev-list", "--count", "master"))
+    for count in range(1, head_count + 2):
+        version = recipe.bgfxConan._version_from_count(count)
+        # Counts a merge skips over, and ones past the head, are no version
+        assert conanfile._first_parent_with_count(work, count) == versions.get(version)
+
+
+@pytest.fixture
+def debug_build(tmp_path):
+    """A package folder with a static lib and a shared lib built with debug info."""
+    if os.name == "nt" or not shutil.which("gcc") or not shutil.which("objcopy"):
+        pytest.skip("needs gcc and objcopy")
+    source = tmp_path / "debug.c"
+    source.write_text("int answer(int x) { int y = x * 2; return y + 42; }\n")
+    package = tmp_path / "package"
+    (package / "lib").mkdir(parents=True)
+    subprocess.run(["gcc", "-g", "-fPIC", "-c", str(source), "-o", str(tmp_path / "debug.o")], check=True)
+    subprocess.run(["ar", "rcs", str(package / "lib" / "libbgfx.a"), str(tmp_path / "debug.o")], check=True)
+    subprocess.run(["gcc", "-g", "-shared", "-Wl,--build-id", str(source), "-o", str(package / "lib" / "libbgfx.so")], check=True)
+    return package
+
+
+def split_debug_conanfile(package, split_debug=True):
+    conanfile = configured(compiler_cache=None)
+    conanfile.options.split_debug = split_debug
+    conanfile.folders.set_base_package(str(package))
+    conanfile.version = "1.0.17"
+    conanfile.info = types.SimpleNamespace(package_id=lambda: "0123abcd")
+    conanfile.run = lambda cmd: subprocess.run(cmd, shell=True, check=True)
+    return conanfile
+
+
+def has_debug_info(path):
+    return b".debug_info" in subprocess.run(["objdump", "-h", str(path)], capture_output=True, check=True).stdout
+
+
+def test_split_debug_keeps_debug_info_out_of_the_package(debug_build, tmp_path, monkeypatch):
+    monkeypatch.setenv("BGFX_CONAN_DEBUG_FOLDER", str(tmp_path / "debug"))
+    conanfile = split_debug_conanfile(debug_build)
+    for artifact in ["lib/libbgfx.a", "lib/libbgfx.so"]:
+        conanfile._split_debug(artifact)
+        assert not has_debug_info(debug_build / artifact)
+    assert sorted(os.listdir(debug_build / "lib")) == ["libbgfx.a", "libbgfx.so"]
+    static_debug = tmp_path / "debug" / "bgfx" / "1.0.17" / "0123abcd" / "lib" / "libbgfx.a"
+    assert has_debug_info(static_debug)
+    build_id = recipe.bgfxConan._elf_build_id(str(debug_build / "lib" / "libbgfx.so"))
+    shared_debug = tmp_path / "debug" / ".build-id" / build_id[:2] / f"{build_id[2:]}.debug"
+    assert has_debug_info(shared_debug)
+
+
+def test_split_debug_without_a_debug_folder_only_strips(debug_build, tmp_path):
+    conanfile = split_debug_conanfile(debug_build)
+    sizes = {name: os.path.getsize(debug_build / "lib" / name) for name in ["libbgfx.a", "libbgfx.so"]}
+    for artifact in ["lib/libbgfx.a", "lib/libbgfx.so"]:
+        conanfile._split_debug(artifact)
+    for name, size in sizes.items():
+        assert os.path.getsize(debug_build / "lib" / name) < size
+    assert sorted(os.listdir(debug_build / "lib")) == ["libbgfx.a", "libbgfx.so"]
+
+
+def test_elf_build_id_matches_readelf(debug_build):
+    if not shutil.which("readelf"):
+        pytest.skip("needs readelf")
+    notes = subprocess.run(["readelf", "-n", str(debug_build / "lib" / "libbgfx.so")], capture_output=True, text=True, check=True).stdout
+    assert f"Build ID: {recipe.bgfxConan._elf_build_id(str(debug_build / 'lib' / 'libbgfx.so'))}" in notes
+    assert recipe.bgfxConan._elf_build_id(str(debug_build / "lib" / "libbgfx.a")) is None
+
+
+def test_split_debug_uses_the_ndk_objcopy_for_android(tmp_path, monkeypatch):
+    llvm_objcopy = tmp_path / "ndk" / "toolchains" / "llvm" / "prebuilt" / "linux-x86_64" / "bin" / "llvm-objcopy"
+    llvm_objcopy.parent.mkdir(parents=True)
+    llvm_objcopy.write_text("")
+    monkeypatch.setenv("ANDROID_NDK_ROOT", str(tmp_path / "ndk"))
+    assert configured(os_name="Android", compiler="clang")._objcopy == f"\"{llvm_objcopy}\""
+    assert configured(os_name="Linux")._objcopy == "objcopy"
+    monkeypatch.setenv("BGFX_CONAN_OBJCOPY", "my-objcopy")
+    assert configured(os_name="Android", compiler="clang")._objcopy == "my-objcopy"
+
+
+@pytest.mark.parametrize("compiler, script", [
+    ("gcc", "echo '  -march=                     \tcooperlake'"),
+    ("clang", "echo ' \"/usr/bin/clang\" \"-cc1\" \"-target-cpu\" \"cooperlake\" \"-E\"' >&2"),
+])
+def test_native_march_is_what_the_compiler_resolves(tmp_path, monkeypatch, compiler, script):
+    folder = tmp_path / "compilers"
+    folder.mkdir()
+    executable = folder / compiler
+    executable.write_text(f"#!/bin/sh\n{script}\n")
+    executable.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{folder}{os.pathsep}{os.environ['PATH']}")
+    conanfile = configured(compiler=compiler, compiler_cache=None)
+    conanfile.info = types.SimpleNamespace(settings=conanfile.settings)
+    assert conanfile._native_march() == "cooperlake"
+
+
+def test_prebuilt_deps_mismatches_are_ignored_for_msvc(monkeypatch):
+    conanfile = configured(os_name="Windows", compiler="msvc", compiler_cache=None)
+    # The packaged bx and bimg aren't linked by the MSBuild projects, so they're never looked at
+    monkeypatch.setattr(recipe.bgfxConan, "dependencies", property(lambda self: pytest.fail("dependencies checked for MSVC")))
+    conanfile.validate_build()
+
+
+def test_folder_size_ignores_files_vanishing_mid_walk(tmp_path, monkeypatch):
+    folder = tmp_path / "mirror"
+    (folder / "objects").mkdir(parents=True)
+    (folder / "objects" / "pack").write_bytes(b"x" * 100)
+    (folder / "HEAD").write_bytes(b"x" * 10)
+    lstat = os.lstat
+
+    def vanishing_lstat(path, *args, **kwargs):
+        # Another job's git gc or eviction removing a file between listing and stat
+        if str(path).endswith("pack"):
+            raise FileNotFoundError(path)
+        return lstat(path, *args, **kwargs)
+
+    monkeypatch.setattr(recipe.os, "lstat", vanishing_lstat)
+    assert recipe.bgfxConan._folder_size([str(folder), str(tmp_path / "missing")]) == 10
+
+
+def test_eviction_survives_mirrors_changing_while_sized(conanfile, tmp_path, monkeypatch):
+    monkeypatch.setenv("BGFX_CONAN_CACHE_MAX_SIZE_MB", "1024")
+    (bx, _), (bimg, _) = make_upstream(tmp_path, "bx", 3), make_upstream(tmp_path, "bimg", 3)
+    bx_mirror = conanfile._update_mirror(bx)
+    lstat = os.lstat
+
+    def vanishing_lstat(path, *args, **kwargs):
+        # Another job's fetch replacing bx's packed refs right while this job sizes the mirrors
+        if str(path).startswith(bx_mirror) and str(path).endswith("packed-refs"):
+            raise FileNotFoundError(path)
+        return lstat(path, *args, **kwargs)
+
+    monkeypatch.setattr(recipe.os, "lstat", vanishing_lstat)
+    assert os.path.isdir(conanfile._update_mirror(bimg))
+    assert os.path.isdir(bx_mirror)
+
+
+def packaging_conanfile(tmp_path, artifacts, os_name="Linux", compiler="gcc", shared=False):
+    conanfile = configured(os_name=os_name, compiler=compiler, compiler_cache=None)
+    conanfile.options.shared = shared
+    build = tmp_path / "build"
+    build.mkdir(exist_ok=True)
+    conanfile.folders.set_base_build(str(build))
+    conanfile.folders.set_base_package(str(tmp_path / "package"))
+    if artifacts is not None:
+        (build / "bgfx_artifacts.json").write_text(json.dumps(artifacts))
+    return conanfile
+
+
+def built(tmp_path, *names):
+    out = tmp_path / "out"
+    out.mkdir(exist_ok=True)
+    for name in names:
+        (out / name).write_bytes(b"built")
+    return out
+
+
+def test_package_manifest_needs_a_build(tmp_path):
+    with pytest.raises(recipe.ConanException, match="needs a build"):
+        packaging_conanfile(tmp_path, None)._package_manifest()
+
+
+def test_package_manifest_refuses_projects_genie_didnt_generate(tmp_path):
+    out = built(tmp_path, "libbgfxRelease.a")
+    conanfile = packaging_conanfile(tmp_path, {"bgfx": str(out / "libbgfxRelease.a"), "shaderc": None})
+    with pytest.raises(recipe.ConanException, match="no project for shaderc"):
+        conanfile._package_manifest()
+
+
+def test_package_manifest_static_lib_and_tools(tmp_path):
+    out = built(tmp_path, "libbgfxRelease.a", "shadercRelease")
+    conanfile = packaging_conanfile(tmp_path, {"bgfx": str(out / "libbgfxRelease.a"), "shaderc": str(out / "shadercRelease")})
+    assert conanfile._package_manifest() == [(str(out / "libbgfxRelease.a"), "lib/libbgfx.a", True),
+                                             (str(out / "shadercRelease"), "bin/shaderc", True)]
+
+
+@pytest.mark.parametrize("compiler, dll, import_lib, packaged_as", [
+    ("gcc", "bgfx-shared-libRelease.dll", "libbgfx-shared-libRelease.dll.a", "lib/libbgfx.a"),
+    ("gcc", "bgfx-shared-libRelease.dll", "libbgfx-shared-libRelease.a", "lib/libbgfx.a"),
+    ("msvc", "bgfx-shared-libRelease.dll", "bgfx-shared-libRelease.lib", "lib/bgfx.lib"),
+])
+def test_package_manifest_finds_the_import_lib(tmp_path, compiler, dll, import_lib, packaged_as):
+    out = built(tmp_path, dll, import_lib)
+    conanfile = packaging_conanfile(tmp_path, {"bgfx": str(out / dll)}, os_name="Windows", compiler=compiler, shared=True)
+    manifest = conanfile._package_manifest()
+    assert manifest[:2] == [(str(out / dll), f"bin/{dll}", True), (str(out / import_lib), packaged_as, True)]
+    # pdbs are packaged when there are some, but not required
+    assert manifest[2:] == ([(str(out / "bgfx-shared-libRelease.pdb"), "lib/bgfx-shared-libRelease.pdb", False)] if compiler == "msvc" else [])
+
+
+@pytest.mark.parametrize("manifest, error", [
+    ([("out/a", "bin/tool", True), ("out/b", "bin/tool", True)], "would be packaged as bin/tool"),
+    ([("out/missing.a", "lib/libbgfx.a", True)], "didn't produce"),
+])
+def test_package_refuses_duplicate_and_missing_artifacts(tmp_path, monkeypatch, manifest, error):
+    out = built(tmp_path, "a", "b")
+    conanfile = packaging_conanfile(tmp_path, {})
+    manifest = [(str(tmp_path / src), dst, required) for src, dst, required in manifest]
+    monkeypatch.setattr(conanfile, "_package_manifest", lambda: manifest)
+    with pytest.raises(recipe.ConanException, match=error):
+        conanfile.package()
+    assert sorted(os.listdir(out)) == ["a", "b"]
+    assert not (tmp_path / "package").exists()
+
+
+@pytest.fixture
+def large_artifact(tmp_path):
+    src = tmp_path / "libbgfx.a"
+    src.write_bytes(os.urandom(2 << 20))
+    return src
+
+
+def test_place_copies_small_files(tmp_path):
+    src = tmp_path / "bgfx.h"
+    src.write_text("small")
+    dst = tmp_path / "package" / "include" / "bgfx.h"
+    assert configured()._place(str(src), str(dst)) == "copy"
+    assert dst.read_text() == "small"
+    assert os.stat(dst).st_ino != os.stat(src).st_ino
+
+
+def test_place_hardlinks_large_files_without_reflinks(large_artifact, tmp_path, monkeypatch):
+    monkeypatch.setattr(recipe.bgfxConan, "_reflink", staticmethod(lambda src, dst: False))
+    dst = tmp_path / "package" / "lib" / "libbgfx.a"
+    dst.parent.mkdir(parents=True)
+    dst.write_bytes(b"previous package")
+    assert configured()._place(str(large_artifact), str(dst)) == "hardlink"
+    assert os.path.samefile(dst, large_artifact)
+
+
+def test_place_copies_large_files_when_links_fail(large_artifact, tmp_path, monkeypatch):
+    monkeypatch.setattr(recipe.bgfxConan, "_reflink", staticmethod(lambda src, dst: False))
+
+    def cross_device_link(src, dst):
+        raise OSError(18, "Invalid cross-device link")
+
+    monkeypatch.setattr(recipe.os, "link", cross_device_link)
+    dst = tmp_path / "package" / "lib" / "libbgfx.a"
+    assert configured()._place(str(large_artifact), str(dst)) == "copy"
+    assert dst.read_bytes() == large_artifact.read_bytes()
+    assert not os.path.samefile(dst, large_artifact)
+
+
+def test_place_prefers_reflinks(large_artifact, tmp_path, monkeypatch):
+    reflinked = []
+
+    def reflink(src, dst):
+        shutil.copyfile(src, dst)
+        reflinked.append(dst)
+        return True
+
+    monkeypatch.setattr(recipe.bgfxConan, "_reflink", staticmethod(reflink))
+    dst = tmp_path / "package" / "lib" / "libbgfx.a"
+    assert configured()._place(str(large_artifact), str(dst)) == "reflink"
+    assert reflinked == [str(dst)]
+
+
+def test_reflink_copies_or_leaves_nothing(large_artifact, tmp_path):
+    dst = tmp_path / "reflinked.a"
+    if recipe.bgfxConan._reflink(str(large_artifact), str(dst)):
+        assert dst.read_bytes() == large_artifact.read_bytes()
+    else:
+        # Filesystems without reflinks (or Windows) leave no partial file for the fallbacks to trip on
+        assert not dst.exists()